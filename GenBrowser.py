@@ -1,37 +1,2321 @@
 import sys
+import os
+import atexit
 import re
 import threading
 import json
+import time
+import argparse
+import hashlib
+import heapq
+import asyncio
+import sqlite3
+import socket
+import itertools
+import functools
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor, as_completed
 import requests 
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit, parse_qs, quote
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup  
+try:
+    import lxml.html
+    import lxml.etree
+except ImportError:  # optional: pages are then rewritten with bs4's html.parser
+    lxml = None
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLineEdit,
     QTabWidget, QTextEdit, QPushButton, QAction, QTabBar, QStylePainter,
     QStyleOptionTab, QStyle, QToolBar, QLabel, QDialog, QListWidget,
     QListWidgetItem, QMessageBox, QComboBox, QInputDialog, QProgressBar
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QObject, QRect, QSize, pyqtSlot, QUrl, QTimer
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QRect, QSize, pyqtSlot, QUrl, QTimer, QBuffer, QByteArray, QIODevice, QFile
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile
+from PyQt5.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
 from PyQt5.QtWebChannel import QWebChannel
-from PyQt5.QtGui import QIcon
+from PyQt5.QtGui import QIcon, QImage
 import ollama
+import httpx
 
 # ------------------ Configuration ------------------
 
 # Initialize the Ollama client with the correct server address
 OLLAMA_SERVER = "http://localhost:11434"
 
+# Every Ollama endpoint generations are spread over (comma separated in OLLAMA_SERVERS)
+OLLAMA_SERVERS = [url.strip() for url in os.getenv("OLLAMA_SERVERS", OLLAMA_SERVER).split(",") if url.strip()]
+
+# Seconds between health and model availability probes of each endpoint
+OLLAMA_HEALTH_CHECK_INTERVAL = 30
+
+# Model used for new sessions and headless batch runs
+DEFAULT_MODEL = "qwen2.5"
+
 # Wikimedia Commons API configuration
-WIKIMEDIA_API_URL = "https://commons.wikimedia.org/w/api.php"
+WIKIMEDIA_API_URL = os.getenv("WIKIMEDIA_API_URL", "https://commons.wikimedia.org/w/api.php")
+IMAGE_SEARCH_LIMIT = 20  # search hits considered per image query
+# Hosts the genimg: scheme downloads from on a page's behalf: Commons' file server and the API host
+IMAGE_SOURCE_HOSTS = {"upload.wikimedia.org", urlsplit(WIKIMEDIA_API_URL).hostname}
+IMAGEINFO_BATCH_SIZE = 50  # titles per imageinfo request (the API maximum)
+IMAGE_PLACEHOLDER_URL = "https://via.placeholder.com/300x200.png?text=No+Image"
+IMAGE_THUMB_WIDTHS = (330, 500, 960, 1280)  # srcset widths, from Commons' standard thumbnail sizes
+
+# Outgoing HTTP: one pooled session, bounded per host and rate limited to stay within Wikimedia's limits
+HTTP_TIMEOUT = (5, 15)  # connect, read seconds
+HTTP_MAX_CONNECTIONS_PER_HOST = 4
+HTTP_RATE_LIMIT = 10  # requests per second per host
+HTTP_USER_AGENT = "GenBrowser/1.0 (https://github.com/imzacksong/GenBrowser)"
+IMAGE_LOOKUP_WORKERS = 8  # threads resolving image queries, shared by all pages
+IMAGE_RESOLVE_DEADLINE = 20  # seconds a page waits for its images before using placeholders
+IMAGE_FALLBACK_HEDGE = 0.75  # seconds a query runs alone before its looser fallback joins the race
+
+# Threads that post-process finished pages away from the GUI thread
+POST_PROCESS_WORKERS = 2
+
+# Parser that rewrites generated pages: "lxml" (C-backed, used when installed) or "soup" (bs4's html.parser)
+HTML_REWRITER = "lxml"
+
+# Minify generated pages before they are cached, stored as site designs and rendered
+MINIFY_HTML = True
+
+# GUI event loop delays longer than this (seconds) count as stalls
+GUI_STALL_THRESHOLD = 0.1
+
+# Only resolve images once they scroll near the viewport (reported by the page over the WebBridge)
+LAZY_IMAGE_LOADING = True
+LAZY_IMAGE_MARGIN = "600px"  # how far outside the viewport an image counts as visible
+
+# Stream model output into the tab while the page is still being generated
+STREAM_GENERATION = True
+
+# Minimum number of seconds between progressive renders of a streaming page
+STREAM_RENDER_INTERVAL = 1.5
+
+# On-disk cache of generated pages
+PAGE_CACHE_DIR = "page_cache"
+PAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+PAGE_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+PAGE_CACHE_INDEX_FLUSH_INTERVAL = 30  # seconds between index writes while only access times changed
+
+# Persistent cache of image search results, shared by every site
+IMAGE_CACHE_PATH = os.path.join(PAGE_CACHE_DIR, "images.sqlite3")
+IMAGE_CACHE_MAX_ENTRIES = 20000
+IMAGE_CACHE_TTL = 30 * 24 * 60 * 60  # seconds
+IMAGE_CACHE_NEGATIVE_TTL = 24 * 60 * 60  # seconds a query with no usable images is remembered
+IMAGE_CACHE_ACCESS_RESOLUTION = 60 * 60  # seconds; a hit rewrites an entry's access time only when it is older
+
+# Downloaded images, served to pages from disk through the genimg: scheme
+IMAGE_BLOB_DIR = os.path.join(PAGE_CACHE_DIR, "images")
+IMAGE_BLOB_MAX_BYTES = 500 * 1024 * 1024
+IMAGE_BLOB_INDEX_FLUSH_INTERVAL = 30  # seconds between writes of the blob store index while it has changes
+IMAGE_RENDER_WIDTH = 1200  # pixels images are downscaled to when the page doesn't give a width
+IMAGE_DOWNLOAD_WORKERS = 4
+
+# Rendered documents kept in memory for the gen:// scheme (and back/forward), least recently used dropped first
+DOCUMENT_STORE_MAX_BYTES = 64 * 1024 * 1024
+
+# Bump whenever the generation prompt changes so stale cached pages are not served
+PROMPT_VERSION = 3
+
+# Generations sent to each Ollama endpoint at once; match the servers' OLLAMA_NUM_PARALLEL
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("OLLAMA_NUM_PARALLEL", "1")) * len(OLLAMA_SERVERS)
+
+# Pre-generate the likeliest subpages into the page cache after a site renders (opt-in)
+PREFETCH_ENABLED = False
+PREFETCH_BUDGET = 3  # internal links prefetched per rendered page
+
+# Upper bound on the CSS carried into subpage prompts by the design fingerprint
+DESIGN_FINGERPRINT_CSS_LIMIT = 6000  # characters
+
+# How long Ollama keeps the model loaded between pages of a site
+SITE_SESSION_KEEP_ALIVE = "30m"
+
+# Bounds on the generation bookkeeping kept for the life of the process
+SITE_SESSION_LIMIT = 64  # site sessions, least recently used dropped first
+SITE_SESSION_STATS_LIMIT = 50  # page timings kept per site session
+GENERATION_STATS_LIMIT = 200  # latest page timings kept in generation_stats
 
 # ---------------------------------------------------
 
-# Initialize the Ollama client
-try:
-    ollama_client = ollama.Client(host=OLLAMA_SERVER, timeout=600)  # Increased timeout to 10 minutes
-except Exception as e:
-    print(f"Failed to connect to Ollama server: {e}")
-    sys.exit(1)
+class OllamaHost:
+    """One Ollama endpoint and the state the pool balances on."""
+    def __init__(self, url):
+        self.url = url
+        self.client = ollama.Client(host=url, timeout=600)  # Increased timeout to 10 minutes
+        self.probe_client = ollama.Client(host=url, timeout=5)
+        self.outstanding = 0
+        self.healthy = True
+        self.models = None  # Unknown until the first probe
+
+    def request_client(self, job):
+        """
+        A client for one cancellable request. It opens its own connection and gives
+        job a close callback that shuts the socket down, so cancelling the job
+        unblocks the read and drops the request on the server straight away.
+        Close it with close_client once the request is done.
+        """
+        def trace(event, info):
+            if event == "connection.connect_tcp.complete":
+                sock = info["return_value"].get_extra_info("socket")
+                job.set_close_callback(functools.partial(shutdown_socket, sock))
+
+        def add_trace(request):
+            request.extensions["trace"] = trace
+
+        return ollama.Client(host=self.url, timeout=600, event_hooks={"request": [add_trace]})
+
+    def has_model(self, model):
+        if self.models is None:
+            return True
+        return (model if ":" in model else f"{model}:latest") in self.models
+
+
+def shutdown_socket(sock):
+    # close() from another thread does not wake a blocked recv, shutdown() does
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def close_client(client, job):
+    job.set_close_callback(None)
+    client._client.close()  # ollama.Client has no close() of its own
+
+
+class OllamaPool:
+    """
+    Spreads Ollama requests over several endpoints. Requests go to the healthy
+    host with the fewest outstanding requests that has the model, and fail over
+    to the next host when a server cannot be reached. Hosts are probed every
+    health_check_interval seconds for liveness and their list of models.
+    """
+    # Errors that mean the server is unreachable rather than that the request was bad
+    FAILOVER_ERRORS = (httpx.TransportError,)
+
+    def __init__(self, urls, health_check_interval=OLLAMA_HEALTH_CHECK_INTERVAL):
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.health_check_interval = health_check_interval
+        self.lock = threading.Lock()
+        threading.Thread(target=self.health_loop, daemon=True).start()
+
+    def probe(self, host):
+        """Refresh a host's health and model list."""
+        try:
+            models = host.probe_client.list().get('models', [])
+            healthy = True
+        except Exception as e:
+            models = None
+            healthy = False
+            if host.healthy:
+                print(f"Ollama server {host.url} failed its health check: {e}")
+        with self.lock:
+            host.healthy = healthy
+            if models is not None:
+                host.models = {model['name'] for model in models}
+
+    def health_loop(self):
+        while True:
+            for host in self.hosts:
+                self.probe(host)
+            time.sleep(self.health_check_interval)
+
+    def acquire(self, model, tried=(), affinity=None):
+        """Lease the best host for model, preferring affinity.host_url if it is not busier than the rest."""
+        with self.lock:
+            untried = [host for host in self.hosts if host not in tried]
+            candidates = ([host for host in untried if host.healthy and host.has_model(model)]
+                          or [host for host in untried if host.healthy]
+                          or untried)
+            if not candidates:
+                return None
+            host = min(candidates, key=lambda h: h.outstanding)
+            preferred = next((h for h in candidates if affinity is not None and h.url == affinity.host_url), None)
+            if preferred is not None and preferred.outstanding <= host.outstanding + 1:
+                host = preferred
+            host.outstanding += 1
+            return host
+
+    def release(self, host, error=None):
+        with self.lock:
+            host.outstanding -= 1
+            if error is not None:
+                host.healthy = False
+        if error is not None:
+            print(f"Ollama server {host.url} is unreachable, failing over: {error}")
+
+    def chat(self, model, messages, stream=False, affinity=None, job=None, **kwargs):
+        """
+        Runs a chat request on the pool. With stream=True a generator of chunks is
+        returned and the host stays leased until the generator is exhausted or closed.
+        affinity is an object whose host_url is preferred and set to the host used.
+        With a GenerationJob, cancelling it closes the connection mid-request; the
+        resulting error is raised without failing over or marking the host down.
+        """
+        if stream:
+            return self.stream_chat(model, messages, affinity, job, **kwargs)
+        tried = []
+        while True:
+            host = self.acquire(model, tried, affinity)
+            if host is None:
+                raise ConnectionError("No Ollama server is reachable.")
+            client = host.client if job is None else host.request_client(job)
+            try:
+                response = client.chat(model=model, messages=messages, **kwargs)
+            except self.FAILOVER_ERRORS as e:
+                if job is not None and job.cancelled:
+                    self.release(host)
+                    raise
+                self.release(host, e)
+                tried.append(host)
+                continue
+            except BaseException:
+                self.release(host)
+                raise
+            finally:
+                if job is not None:
+                    close_client(client, job)
+            self.release(host)
+            if affinity is not None:
+                affinity.host_url = host.url
+            return response
+
+    def stream_chat(self, model, messages, affinity=None, job=None, **kwargs):
+        tried = []
+        while True:
+            host = self.acquire(model, tried, affinity)
+            if host is None:
+                raise ConnectionError("No Ollama server is reachable.")
+            client = host.client if job is None else host.request_client(job)
+            stream = client.chat(model=model, messages=messages, stream=True, **kwargs)
+            received = False
+            try:
+                for chunk in stream:
+                    received = True
+                    yield chunk
+            except self.FAILOVER_ERRORS as e:
+                if job is not None and job.cancelled:
+                    self.release(host)
+                    raise
+                self.release(host, e)
+                # Part of the page has already been shown, so it cannot be restarted elsewhere
+                if received:
+                    raise
+                tried.append(host)
+                continue
+            except BaseException:
+                self.release(host)
+                raise
+            finally:
+                stream.close()
+                if job is not None:
+                    close_client(client, job)
+            self.release(host)
+            if affinity is not None:
+                affinity.host_url = host.url
+            return
+
+    def pull(self, model, **kwargs):
+        """Pull a model onto the least loaded healthy host that does not have it yet."""
+        with self.lock:
+            candidates = ([host for host in self.hosts if host.healthy and not host.has_model(model)]
+                          or [host for host in self.hosts if host.healthy]
+                          or self.hosts)
+            host = min(candidates, key=lambda h: h.outstanding)
+        print(f"Pulling model '{model}' on {host.url}")
+        return host.client.pull(model, **kwargs)
+
+
+# The Ollama endpoint pool, created on first use so importing the module starts no threads
+_ollama_pool = None
+_ollama_pool_lock = threading.Lock()
+
+
+def get_ollama_pool():
+    """Return the shared OllamaPool, creating it on first use."""
+    global _ollama_pool
+    with _ollama_pool_lock:
+        if _ollama_pool is None:
+            _ollama_pool = OllamaPool(OLLAMA_SERVERS)
+        return _ollama_pool
+
+
+def start_ollama_pool():
+    """Create the endpoint pool up front, exiting when it cannot be set up."""
+    try:
+        get_ollama_pool()
+    except Exception as e:
+        print(f"Failed to connect to Ollama server: {e}")
+        sys.exit(1)
+
+
+def estimate_tokens(text):
+    """Rough token count for prompt size reporting (about four characters per token)."""
+    return len(text) // 4
+
+
+@functools.lru_cache(maxsize=32)
+def extract_design_fingerprint(html):
+    """
+    Reduces a generated page to the parts a subpage needs to match its look:
+    stylesheets, CSS rules, color palette, common class names and the
+    header/nav/footer skeleton with text and attributes trimmed.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    sections = []
+
+    stylesheets = [link['href'] for link in soup.find_all('link', href=True) if 'stylesheet' in (link.get('rel') or [])]
+    if stylesheets:
+        sections.append("Stylesheets: " + ", ".join(dict.fromkeys(stylesheets)))
+
+    css = " ".join(style.get_text() for style in soup.find_all('style'))
+    css = re.sub(r'/\*[\s\S]*?\*/', '', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,])\s*', r'\1', css).strip()
+    if len(css) > DESIGN_FINGERPRINT_CSS_LIMIT:
+        # Cut at a rule boundary so the prompt never ends mid-declaration, unless one rule fills the limit
+        boundary = css.rfind('}', 0, DESIGN_FINGERPRINT_CSS_LIMIT)
+        css = css[:boundary + 1] if boundary != -1 else css[:DESIGN_FINGERPRINT_CSS_LIMIT]
+
+    inline_styles = " ".join(element['style'] for element in soup.find_all(style=True))
+    colors = Counter(c.lower() for c in re.findall(r'#[0-9a-fA-F]{3,8}\b|(?:rgba?|hsla?)\([^)]*\)', f"{css} {inline_styles}"))
+    if colors:
+        sections.append("Color palette: " + ", ".join(color for color, _ in colors.most_common(10)))
+
+    classes = Counter(name for element in soup.find_all(class_=True) for name in element.get('class', []))
+    if classes:
+        sections.append("Common classes: " + " ".join(name for name, _ in classes.most_common(40)))
+
+    if css:
+        sections.append(f"CSS:\n{css}")
+
+    for name in ('header', 'nav', 'footer'):
+        element = soup.find(name)
+        if element is None or (name == 'nav' and element.find_parent('header')):
+            continue
+        fragment = BeautifulSoup(str(element), 'html.parser')
+        for tag in fragment.find_all(['script', 'style', 'svg']):
+            tag.decompose()
+        for tag in fragment.find_all(True):
+            tag.attrs = {key: value for key, value in tag.attrs.items() if key in ('class', 'id', 'href', 'role')}
+        for text in fragment.find_all(string=True):
+            trimmed = " ".join(text.split())
+            text.replace_with(trimmed[:40] + ("..." if len(trimmed) > 40 else ""))
+        sections.append(f"{name.capitalize()} markup:\n{fragment}")
+
+    return "\n\n".join(sections)
+
+
+class SiteSession:
+    """
+    Generation state shared by every page of a site. All pages are requested
+    with the same leading system message (instructions plus design fingerprint)
+    and only the page topic comes last, so Ollama can reuse the prefix it has
+    already evaluated instead of prefilling it again for every subpage.
+    """
+    SYSTEM_PROMPT = """You are an assistant that generates unique, creative, and high-quality HTML, CSS, and JavaScript content without any markdown or code blocks.
+
+Using HTML, CSS, and JavaScript, create a unique, modern, and professional website about the topic the user gives you.
+Incorporate modern web design practices using frameworks like Bootstrap or Materialize.
+Be imaginative, incorporating design elements, interactive features, animations, and layouts.
+Ensure that all code is valid and tested, and avoid any JavaScript errors.
+Important: Do not use any placeholder text like "Lorem ipsum". Instead, write meaningful content related to the topic.
+Include relevant images in the website by adding <img> tags with descriptive alt attributes, and include images using inline CSS styles like 'background-image', but use placeholder URLs like 'your_image_here.jpg'.
+Do not include any actual image URLs in the code.
+Do not include any external links except for CDN links to Bootstrap or other frameworks."""
+
+    def __init__(self, model, design_fingerprint=""):
+        self.model = model
+        self.lock = threading.Lock()
+        self.page_stats = deque(maxlen=SITE_SESSION_STATS_LIMIT)
+        self.first_stats = None
+        self.page_count = 0
+        self.host_url = None  # Ollama host whose prompt cache holds this session's prefix
+        system_prompt = self.SYSTEM_PROMPT
+        # For a subpage, instruct the AI to keep the main page's design.
+        # Only the compact fingerprint (see extract_design_fingerprint) goes into the prompt, not the full page.
+        if design_fingerprint:
+            print(f"Base design prompt size: ~{estimate_tokens(design_fingerprint)} tokens")
+            system_prompt += ("\n\nMaintain the same overall design and layout as the site's main page, "
+                              f"summarized here:\n\n{design_fingerprint}")
+        self.prefix_messages = [{"role": "system", "content": system_prompt}]
+
+    def messages_for(self, topic):
+        """Return the chat messages for one page: the shared prefix, then the page topic."""
+        return self.prefix_messages + [
+            {"role": "user", "content": f"Create the website about {topic}. Write meaningful content related to {topic}."}
+        ]
+
+    def record(self, topic, stats):
+        """Keep the timing Ollama reported for a page and log it against the first page."""
+        with self.lock:
+            self.page_stats.append({"topic": topic, **stats})
+            self.page_count += 1
+            if self.first_stats is None:
+                self.first_stats = self.page_stats[0]
+            first, page_count = self.first_stats, self.page_count
+        if page_count > 1 and first.get("prompt_eval_duration") is not None:
+            print(f"Site session page {page_count}: prompt eval {format_duration(stats.get('prompt_eval_duration'))} "
+                  f"(first page {format_duration(first['prompt_eval_duration'])})")
+
+
+def format_duration(nanoseconds):
+    """Format an Ollama duration (nanoseconds) in milliseconds."""
+    if nanoseconds is None:
+        return "n/a"
+    return f"{nanoseconds / 1e6:.0f} ms"
+
+
+def response_stats(response):
+    """Pick the timing and token counters out of a final Ollama chat response."""
+    names = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration", "total_duration")
+    return {name: response.get(name) for name in names}
+
+
+class PageCache:
+    """
+    Content-addressed, size-bounded LRU cache of generated pages on disk. The index is
+    written on every put; hits only update it in memory, and those changes are written
+    at most every index_flush_interval seconds and at exit.
+    """
+    def __init__(self, cache_dir=PAGE_CACHE_DIR, max_bytes=PAGE_CACHE_MAX_BYTES, ttl=PAGE_CACHE_TTL,
+                 index_flush_interval=PAGE_CACHE_INDEX_FLUSH_INTERVAL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.index_flush_interval = index_flush_interval
+        self.lock = threading.Lock()
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self.load_index()
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(topic, model, design_fingerprint=""):
+        """
+        Hash everything that shapes the model's output into a cache key. The design enters as its
+        fingerprint (what the model sees of it), so regenerating a main page with the same look
+        still matches the subpages built on it.
+        """
+        payload = json.dumps([topic, model, design_fingerprint, PROMPT_VERSION])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load_index(self):
+        """Load the cache index from disk."""
+        try:
+            with open(self.index_path, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_index(self):
+        """Write the cache index to disk."""
+        try:
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(self.index, file)
+            os.replace(temp_path, self.index_path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Failed to save page cache index: {e}")
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        """Write the index to disk if it changed since the last write."""
+        with self.lock:
+            if self.dirty:
+                self.save_index()
+
+    def mark_dirty(self):
+        # Called with the lock held
+        self.dirty = True
+        if time.monotonic() - self.last_flush >= self.index_flush_interval:
+            self.save_index()
+
+    def page_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.html")
+
+    def get(self, key):
+        """Return the cached page for the key, or None on a miss or an expired entry."""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["created"] > self.ttl:
+                self.remove(key)
+                self.mark_dirty()
+                return None
+            try:
+                with open(self.page_path(key), "r", encoding="utf-8") as file:
+                    html = file.read()
+            except OSError:
+                self.index.pop(key, None)
+                self.mark_dirty()
+                return None
+            entry["accessed"] = time.time()
+            self.mark_dirty()
+            return html
+
+    def put(self, key, html):
+        """Store a page and evict least recently used entries past the size limit."""
+        data = html.encode("utf-8")
+        with self.lock:
+            try:
+                with open(self.page_path(key), "wb") as file:
+                    file.write(data)
+            except OSError as e:
+                print(f"Failed to write page cache entry: {e}")
+                return
+            now = time.time()
+            self.index[key] = {"created": now, "accessed": now, "size": len(data)}
+            self.evict()
+            self.save_index()
+
+    def remove(self, key):
+        self.index.pop(key, None)
+        try:
+            os.remove(self.page_path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until under max_bytes."""
+        now = time.time()
+        for key in [k for k, entry in self.index.items() if now - entry["created"] > self.ttl]:
+            self.remove(key)
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["accessed"]):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]["size"]
+            self.remove(key)
+
+
+class GenerationRegistry:
+    """Tracks in-flight page generations so identical requests share one model call."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.coalesced_count = 0
+
+    @staticmethod
+    def make_key(topic, design_fingerprint, model):
+        design_hash = hashlib.sha256(design_fingerprint.encode("utf-8")).hexdigest()
+        return (topic, design_hash, model)
+
+    def attach(self, key, tab, force_new=False):
+        """
+        Subscribes a tab (its QWebEngineView) to the generation for key and returns (future, is_new).
+        A tab of None runs the generation without a tab (prefetching).
+        When is_new is True the caller owns the work and must call finish().
+        force_new starts a fresh generation even if an identical one is running.
+        """
+        tabs = [tab] if tab is not None else []
+        with self.lock:
+            entry = self.in_flight.get(key)
+            if entry and not force_new:
+                # Tabs are told apart by identity, so two tabs with the same title each get the page
+                entry["tabs"].extend(waiting for waiting in tabs if waiting not in entry["tabs"])
+                self.coalesced_count += 1
+                return entry["future"], False
+            future = Future()
+            self.in_flight[key] = {"future": future, "tabs": tabs, "job": None}
+            return future, True
+
+    def set_job(self, key, future, job):
+        """Record the scheduler job running the generation for key."""
+        with self.lock:
+            entry = self.in_flight.get(key)
+            if entry and entry["future"] is future:
+                entry["job"] = job
+            elif future.cancelled():
+                job.cancel()
+
+    def tabs_for(self, key):
+        """Return the tabs waiting on the generation for key."""
+        with self.lock:
+            entry = self.in_flight.get(key)
+            return list(entry["tabs"]) if entry else []
+
+    def jobs(self):
+        """Return (job, tabs) for every scheduled in-flight generation."""
+        with self.lock:
+            return [(entry["job"], list(entry["tabs"])) for entry in self.in_flight.values() if entry["job"]]
+
+    def detach(self, tab):
+        """
+        Unsubscribes a tab from its generations. A generation that no other tab
+        is waiting on is cancelled so the model is freed immediately.
+        """
+        with self.lock:
+            for key, entry in list(self.in_flight.items()):
+                if tab not in entry["tabs"]:
+                    continue
+                entry["tabs"] = [waiting for waiting in entry["tabs"] if waiting is not tab]
+                if not entry["tabs"]:
+                    del self.in_flight[key]
+                    entry["future"].cancel()
+                    if entry["job"]:
+                        entry["job"].cancel()
+
+    def finish(self, key, future, html):
+        """Resolve a generation and release its key for new requests."""
+        with self.lock:
+            entry = self.in_flight.get(key)
+            if entry and entry["future"] is future:
+                del self.in_flight[key]
+        try:
+            future.set_result(html)
+        except InvalidStateError:
+            # Cancelled while the result was being produced
+            pass
+
+
+class GenerationJob:
+    """A scheduled page generation that can be cancelled while queued or streaming."""
+    def __init__(self, work, priority):
+        self.work = work
+        self.priority = priority
+        self.started = False
+        self.cancel_event = threading.Event()
+        self.close_callback = None
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.cancel_event.set()
+            close, self.close_callback = self.close_callback, None
+        if close is not None:
+            close()
+
+    def set_close_callback(self, callback):
+        """
+        Registers callback() to tear down the job's live request when it is cancelled,
+        replacing any earlier one; None clears it. Runs it at once if already cancelled.
+        """
+        with self.lock:
+            if not self.cancel_event.is_set():
+                self.close_callback = callback
+                return
+        if callback is not None:
+            callback()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+
+class GenerationScheduler:
+    """Runs generations on a fixed pool of workers, lowest priority value first."""
+    FOREGROUND = 0
+    BACKGROUND = 1
+    IDLE = 2
+
+    def __init__(self, max_workers=MAX_CONCURRENT_GENERATIONS):
+        self.queue = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        for _ in range(max(1, max_workers)):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def submit(self, work, priority=BACKGROUND):
+        """Queue work(job) and return its GenerationJob."""
+        job = GenerationJob(work, priority)
+        with self.condition:
+            heapq.heappush(self.queue, (priority, next(self.sequence), job))
+            self.condition.notify()
+        return job
+
+    def set_priority(self, job, priority):
+        """Move a queued job to a new priority; running jobs are left alone."""
+        with self.condition:
+            if job.started or job.priority == priority:
+                return
+            # The old heap entry goes stale and is skipped by the workers
+            job.priority = priority
+            heapq.heappush(self.queue, (priority, next(self.sequence), job))
+            self.condition.notify()
+
+    def worker(self):
+        while True:
+            with self.condition:
+                while True:
+                    while not self.queue:
+                        self.condition.wait()
+                    priority, _, job = heapq.heappop(self.queue)
+                    if not (job.started or job.cancelled or priority != job.priority):
+                        job.started = True
+                        break
+            try:
+                job.work(job)
+            except Exception as e:
+                print(f"Generation job failed: {e}")
+
+
+class StreamingHtmlExtractor:
+    """
+    Extracts the page from the model's response while it streams in. feed() takes chunks
+    as they arrive and returns the HTML they add: a leading <think> block and chatter before
+    the ```html fence (or the <!DOCTYPE/<html start, whichever comes first) are dropped, and
+    everything after the closing fence or </html> is ignored. A fence that opens before the
+    document closes wins, as in "Here's the <html> page:\n```html\n<html>...", and the
+    document text so far is discarded. Only the few characters that could begin a marker
+    are carried over between chunks, so the response is scanned once.
+    """
+    SEARCHING, THINKING, FENCED, DOCUMENT, DONE = range(5)
+    START_MARKERS = ("```html", "<!doctype", "<html")
+    THINK_START, THINK_END = "<think>", "</think>"
+
+    def __init__(self):
+        self.state = self.SEARCHING
+        self.carry = ""
+        self.parts = []
+        self.length = 0
+        self.skipped = []  # text before the HTML, the whole result if no HTML ever starts
+        self.chatter = False
+        self.skip_space = False
+
+    @property
+    def done(self):
+        return self.state == self.DONE
+
+    @property
+    def html(self):
+        """The HTML extracted so far."""
+        return "".join(self.parts)
+
+    def feed(self, chunk):
+        """Consumes one chunk of the response and returns the HTML it adds, possibly ""."""
+        if self.state == self.DONE or not chunk:
+            return ""
+        text = self.carry + chunk
+        self.carry = ""
+        parts, added = self.parts, len(self.parts)
+        if self.state == self.THINKING:
+            text = self.skip_thinking(text)
+        elif self.state == self.SEARCHING:
+            text = self.find_start(text)
+        if text and self.state == self.DOCUMENT:
+            # Returns the text after a ```html fence if one turns up before </html>
+            text = self.find_document_end(text)
+        if text and self.skip_space:
+            # Like the \s* after the fence in extract_html
+            text = text.lstrip()
+            self.skip_space = not text
+        if text and self.state == self.FENCED:
+            self.find_end(text, "```", include=False)
+        if self.parts is not parts:
+            # The document was chatter around a fenced page; everything so far is replaced
+            return self.html
+        return "".join(self.parts[added:])
+
+    @staticmethod
+    def marker_prefix_length(lower, markers):
+        """Length of the longest tail of lower that could be the beginning of one of the markers."""
+        for length in range(max(map(len, markers)) - 1, 0, -1):
+            tail = lower[-length:]
+            if len(tail) == length and any(marker.startswith(tail) for marker in markers):
+                return length
+        return 0
+
+    def find_start(self, text):
+        """Returns the text from where the HTML starts, or "" while it hasn't yet."""
+        if not self.chatter:
+            stripped = text.lstrip()
+            if self.THINK_START.startswith(stripped[:len(self.THINK_START)].lower()) and stripped:
+                if len(stripped) < len(self.THINK_START):
+                    # Could still become <think>; wait for more
+                    self.carry = text
+                    return ""
+                # Reasoning models think out loud before answering
+                self.skipped.append(text[:len(text) - len(stripped)])
+                self.state = self.THINKING
+                return self.skip_thinking(stripped)
+            if stripped.startswith('<'):
+                # The response is HTML from its first character
+                self.skipped.append(text[:len(text) - len(stripped)])
+                self.state = self.DOCUMENT
+                return stripped
+            self.chatter = bool(stripped)
+        lower = text.lower()
+        found = [(lower.find(marker), marker) for marker in self.START_MARKERS if marker in lower]
+        if found:
+            index, marker = min(found)
+            self.skipped.append(text[:index])
+            if marker == "```html":
+                self.state = self.FENCED
+                self.skip_space = True
+                return text[index + len(marker):]
+            self.state = self.DOCUMENT
+            return text[index:]
+        keep = self.marker_prefix_length(lower, self.START_MARKERS)
+        self.skipped.append(text[:len(text) - keep])
+        self.carry = text[len(text) - keep:]
+        return ""
+
+    def skip_thinking(self, text):
+        """Drops the <think> block; returns what follows it, from where the HTML starts."""
+        lower = text.lower()
+        index = lower.find(self.THINK_END)
+        if index == -1:
+            keep = self.marker_prefix_length(lower, (self.THINK_END,))
+            self.skipped.append(text[:len(text) - keep])
+            self.carry = text[len(text) - keep:]
+            return ""
+        index += len(self.THINK_END)
+        self.skipped.append(text[:index])
+        self.state = self.SEARCHING
+        return self.find_start(text[index:])
+
+    def find_document_end(self, text):
+        """Adds the document text up to </html>, or switches to a ```html fence that opens first."""
+        lower = text.lower()
+        end = lower.find("</html>")
+        fence = lower.find("```html")
+        if fence != -1 and (end == -1 or fence < end):
+            self.parts = []
+            self.length = 0
+            self.state = self.FENCED
+            self.skip_space = True
+            return text[fence + len("```html"):]
+        if end != -1:
+            self.add(text[:end + len("</html>")])
+            self.state = self.DONE
+            return ""
+        keep = self.marker_prefix_length(lower, ("</html>", "```html"))
+        self.add(text[:len(text) - keep])
+        self.carry = text[len(text) - keep:]
+        return ""
+
+    def find_end(self, text, marker, include):
+        lower = text.lower()
+        index = lower.find(marker)
+        if index != -1:
+            self.add(text[:index + len(marker) if include else index])
+            self.state = self.DONE
+            return
+        keep = self.marker_prefix_length(lower, (marker,))
+        self.add(text[:len(text) - keep])
+        self.carry = text[len(text) - keep:]
+
+    def add(self, html):
+        if html:
+            self.parts.append(html)
+            self.length += len(html)
+
+    def result(self):
+        """The extracted page once the whole response has been fed."""
+        if self.state in (self.SEARCHING, self.THINKING):
+            content = "".join(self.skipped) + self.carry
+            if content:
+                # If no HTML is found, return entire content
+                print("HTML tags not found in content. Using entire content.")
+            return content
+        # An unterminated page keeps what arrived, including a carried partial marker
+        return (self.html + self.carry).strip()
+
+
+def extract_html(content):
+    """
+    Extracts HTML content from the model's response.
+    It looks for HTML within ```html ... ``` code blocks or, failing that, for the
+    <html> document itself; see StreamingHtmlExtractor.
+    """
+    extractor = StreamingHtmlExtractor()
+    extractor.feed(content)
+    return extractor.result()
+
+
+class TokenBucket:
+    """Client-side rate limiter: allows `rate` calls per second with bursts of up to `capacity`."""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    """
+    Shared keep-alive session for outgoing requests. Every request gets connect/read
+    timeouts, waits for one of the host's connection slots and for its rate limiter.
+    """
+    def __init__(self, max_per_host=HTTP_MAX_CONNECTIONS_PER_HOST, rate=HTTP_RATE_LIMIT, timeout=HTTP_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = HTTP_USER_AGENT
+        # Back off and retry when the API asks us to slow down, honouring Retry-After
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_per_host, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def limits_for(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = (threading.BoundedSemaphore(self.max_per_host), TokenBucket(self.rate))
+            return self.hosts[host]
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        slots, bucket = self.limits_for(url)
+        with slots:
+            bucket.acquire()
+            return self.session.get(url, **kwargs)
+
+
+http_client = HttpClient()
+
+# Image queries of every page share these workers instead of a thread per element
+image_lookup_executor = ThreadPoolExecutor(max_workers=IMAGE_LOOKUP_WORKERS, thread_name_prefix="image-lookup")
+
+
+class ImageLookupStats:
+    """Counts the Wikimedia API requests and image cache hits made while resolving the images of one page."""
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def count_cache_hit(self):
+        with self.lock:
+            self.cache_hits += 1
+
+
+class ImageCache:
+    """
+    Persistent SQLite cache of image search results, keyed by normalized query.
+    Queries without usable images are cached too, for a shorter time.
+    """
+    def __init__(self, path=IMAGE_CACHE_PATH, max_entries=IMAGE_CACHE_MAX_ENTRIES,
+                 ttl=IMAGE_CACHE_TTL, negative_ttl=IMAGE_CACHE_NEGATIVE_TTL,
+                 access_resolution=IMAGE_CACHE_ACCESS_RESOLUTION):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.access_resolution = access_resolution
+        self.lock = threading.Lock()
+        self.connection = None
+
+    @staticmethod
+    def normalize(query):
+        """Case, punctuation and spacing don't change what Commons returns."""
+        return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+    def connect(self):
+        # Opened on first use so importing the module never touches the disk
+        if self.connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS image_thumbnails ("
+                "query TEXT PRIMARY KEY, urls TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS image_thumbnails_accessed ON image_thumbnails (accessed)")
+            # Caches written before thumbnails were used stored originals in "images"; nothing reads them any more
+            self.connection.execute("DROP TABLE IF EXISTS images")
+            self.connection.commit()
+        return self.connection
+
+    def get(self, query):
+        """Return the cached candidate URLs for the query ([] for a known miss), or None if not cached."""
+        key = self.normalize(query)
+        with self.lock:
+            try:
+                connection = self.connect()
+                row = connection.execute("SELECT urls, created, accessed FROM image_thumbnails WHERE query = ?",
+                                         (key,)).fetchone()
+                if row is None:
+                    return None
+                urls = json.loads(row[0])
+                now = time.time()
+                if now - row[1] > (self.ttl if urls else self.negative_ttl):
+                    connection.execute("DELETE FROM image_thumbnails WHERE query = ?", (key,))
+                    connection.commit()
+                    return None
+                if now - row[2] > self.access_resolution:
+                    # LRU order only needs coarse access times; most hits stay read-only
+                    connection.execute("UPDATE image_thumbnails SET accessed = ? WHERE query = ?", (now, key))
+                    connection.commit()
+                return urls
+            except (sqlite3.Error, ValueError) as e:
+                print(f"Image cache lookup failed: {e}")
+                return None
+
+    def put(self, query, urls):
+        """Store the candidate URLs for the query and drop the least recently used entries past max_entries."""
+        key = self.normalize(query)
+        now = time.time()
+        with self.lock:
+            try:
+                connection = self.connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO image_thumbnails (query, urls, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(urls), now, now)
+                )
+                connection.execute(
+                    "DELETE FROM image_thumbnails WHERE query IN "
+                    "(SELECT query FROM image_thumbnails ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"Image cache write failed: {e}")
+
+
+image_cache = ImageCache()
+
+
+def image_candidates(query, stats=None):
+    """
+    Ranked image URLs for a query from the image cache or Wikimedia Commons,
+    [] when Commons has none, or None if the lookup failed.
+    """
+    candidates = image_cache.get(query)
+    if candidates is not None:
+        if stats:
+            stats.count_cache_hit()
+        return candidates
+    candidates = search_images(query, stats)
+    if candidates is not None:
+        # Network or API failures are not remembered as misses
+        image_cache.put(query, candidates)
+    return candidates
+
+
+def fallback_queries(query):
+    """The query followed by progressively looser variants to try when it finds nothing ([] for a blank query)."""
+    words = query.split()
+    if not words:
+        return []
+    query = " ".join(words)
+    ladder = [query, f"{query} photo"]
+    if len(words) > 2:
+        ladder.append(" ".join(words[:2]))
+    return ladder
+
+
+def search_images(query, stats=None):
+    """
+    Returns the usable image URLs for a query in search rank order, or None if
+    the request failed. The search hits and their imageinfo come back in a single request.
+    """
+    params = {
+        "action": "query",
+        "format": "json",
+        "generator": "search",
+        "gsrsearch": query,
+        "gsrnamespace": 6,
+        "gsrlimit": IMAGE_SEARCH_LIMIT,
+        "prop": "imageinfo",
+        "iiprop": "url|mime",
+        "iiurlwidth": IMAGE_THUMB_WIDTHS[-1]
+    }
+    try:
+        if stats:
+            stats.count_request()
+        response = http_client.get(WIKIMEDIA_API_URL, params=params)
+        if response.status_code != 200:
+            print(f"Failed to fetch image from Wikimedia Commons: {response.status_code}")
+            return None
+        data = response.json()
+    except Exception as e:
+        print(f"Exception while fetching image: {e}")
+        return None
+    error = api_error(data)
+    if error:
+        print(f"Wikimedia Commons search failed: {error}")
+        return None
+    # Result pages are keyed by page id; "index" carries the search rank
+    pages = sorted(data.get("query", {}).get("pages", {}).values(), key=lambda page: page.get("index", 0))
+    missing, complete = {}, True
+    if "continue" in data:
+        # The API cut the imageinfo short; fetch the rest in one batch instead of continuing page by page
+        missing, complete = fetch_imageinfo([page["title"] for page in pages if "imageinfo" not in page], stats)
+    urls = []
+    for page in pages:
+        url = usable_image_url(page) or missing.get(page["title"])
+        if url:
+            urls.append(url)
+    if not urls and not complete:
+        # There were hits we could not look at, so this is not a real miss
+        return None
+    return urls
+
+
+def api_error(data):
+    """
+    The error message of a MediaWiki API response, or None. API errors (rate
+    limits, maxlag, bad parameters) come back with HTTP 200.
+    """
+    error = data.get("error")
+    if not error:
+        return None
+    if isinstance(error, dict):
+        return error.get("info") or error.get("code") or "unknown error"
+    return str(error)
+
+
+def fetch_imageinfo(titles, stats=None):
+    """
+    Returns ({title: image URL}, complete) for file titles, batching up to
+    IMAGEINFO_BATCH_SIZE titles per request. complete is False if a batch failed.
+    """
+    titles = list(dict.fromkeys(titles))
+    urls = {}
+    complete = True
+    for start in range(0, len(titles), IMAGEINFO_BATCH_SIZE):
+        params = {
+            "action": "query",
+            "format": "json",
+            "titles": "|".join(titles[start:start + IMAGEINFO_BATCH_SIZE]),
+            "prop": "imageinfo",
+            "iiprop": "url|mime",
+            "iiurlwidth": IMAGE_THUMB_WIDTHS[-1]
+        }
+        try:
+            if stats:
+                stats.count_request()
+            response = http_client.get(WIKIMEDIA_API_URL, params=params)
+            if response.status_code != 200:
+                print(f"Failed to fetch image info from Wikimedia Commons: {response.status_code}")
+                complete = False
+                continue
+            data = response.json()
+        except Exception as e:
+            print(f"Exception while fetching image info: {e}")
+            complete = False
+            continue
+        error = api_error(data)
+        if error:
+            print(f"Wikimedia Commons image info failed: {error}")
+            complete = False
+            continue
+        for page in data.get("query", {}).get("pages", {}).values():
+            url = usable_image_url(page)
+            if url:
+                urls[page["title"]] = url
+    return urls, complete
+
+
+def usable_image_url(page):
+    """
+    The thumbnail URL of an API result page (the original when Commons has no
+    larger thumbnail), or None if it is not a displayable image.
+    """
+    valid_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp')
+    if not page.get("imageinfo"):
+        return None
+    imageinfo = page["imageinfo"][0]
+    mime_type = imageinfo.get("mime", "")
+    image_url = imageinfo.get("url", "")
+    if mime_type.startswith("image/") and image_url.lower().endswith(valid_extensions):
+        return imageinfo.get("thumburl") or image_url
+    return None
+
+
+THUMBNAIL_WIDTH_PATTERN = re.compile(r'/(\d+)px-([^/]+)$')
+
+
+def thumbnail_variants(image_url):
+    """
+    [(width, url)] for the IMAGE_THUMB_WIDTHS Commons can render from a thumbnail URL,
+    never wider than the thumbnail itself. Empty if image_url is not a Commons thumbnail.
+    """
+    match = THUMBNAIL_WIDTH_PATTERN.search(image_url)
+    if not match or '/thumb/' not in image_url:
+        return []
+    thumb_width = int(match.group(1))
+    widths = [width for width in IMAGE_THUMB_WIDTHS if width < thumb_width] + [thumb_width]
+    return [(width, image_url[:match.start()] + f"/{width}px-{match.group(2)}") for width in widths]
+
+
+def thumbnail_for_width(image_url, width):
+    """The narrowest thumbnail variant at least width pixels wide."""
+    for variant_width, variant_url in thumbnail_variants(image_url):
+        if variant_width >= width:
+            return variant_url
+    return image_url
+
+
+def image_sizes(element):
+    """A sizes attribute guessed from where the <img> sits in the layout."""
+    width = str(element.get('width', '')).strip().lower().replace('px', '')
+    if width.isdigit():
+        return f"{width}px"
+    for parent in element.parents:
+        classes = parent.get('class') or []
+        if any(name == 'card' or name.startswith('col-') for name in classes):
+            # Bootstrap cards and grid columns collapse to full width on small screens
+            return "(max-width: 768px) 100vw, 33vw"
+    return "100vw"
+
+
+# One image placeholder in a page: an <img> (bg_url None) or a placeholder background-image
+ImageSlot = namedtuple("ImageSlot", "id element query bg_url")
+
+BACKGROUND_IMAGE_PATTERN = re.compile(r'background-image\s*:\s*url\([\'"]?(.*?)[\'"]?\)', re.IGNORECASE)
+PLACEHOLDER_BACKGROUNDS = ('path/to/your/background.jpg', 'placeholder', 'your_image_here')
+
+
+def image_query(text):
+    """Simplify query by removing special characters and taking first few words."""
+    query = re.sub(r'[^\w\s]', '', text)
+    return ' '.join(query.split()[:5])
+
+
+def collect_image_slots(document, topic):
+    """Finds every image the page needs before anything is looked up."""
+    slots = []
+    for img_tag in document.images:
+        # Simplify the query to improve image search results
+        query = image_query(img_tag['alt']) if img_tag.get('alt') else topic
+        slots.append(ImageSlot(len(slots), img_tag, query, None))
+
+    # Only styles that actually set a background image are worth a lookup
+    for element in document.backgrounds:
+        match = BACKGROUND_IMAGE_PATTERN.search(element['style'])
+        bg_url = match.group(1)
+        # If the URL is a placeholder, fetch a new image
+        if any(placeholder in bg_url for placeholder in PLACEHOLDER_BACKGROUNDS):
+            # Use the alt attribute or topic as the query
+            slots.append(ImageSlot(len(slots), element, image_query(element.get('alt', topic)), bg_url))
+    return slots
+
+
+class ImageResolver:
+    """
+    Resolves the image slots of pages concurrently on one asyncio event loop running
+    in a background thread. The blocking Wikimedia lookups run on image_lookup_executor,
+    so they go through the shared, rate-limited http_client.
+    """
+    def __init__(self, executor, deadline=IMAGE_RESOLVE_DEADLINE):
+        self.executor = executor
+        self.deadline = deadline
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def ensure_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="image-resolver", daemon=True).start()
+            return self.loop
+
+    async def first_hit(self, ladder, stats):
+        """
+        Candidates of the first fallback query that finds any. Each rung gets a head start of
+        IMAGE_FALLBACK_HEDGE seconds before the next one joins the race; a miss starts the next at once.
+        """
+        loop = asyncio.get_running_loop()
+        pending = set()
+
+        async def wait_for_hit(timeout):
+            end = None if timeout is None else loop.time() + timeout
+            while pending:
+                remaining = None if end is None else end - loop.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    return None
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None and task.result():
+                        return task.result()
+            return None
+
+        try:
+            for query in ladder:
+                pending.add(loop.run_in_executor(self.executor, image_candidates, query, stats))
+                candidates = await wait_for_hit(IMAGE_FALLBACK_HEDGE)
+                if candidates:
+                    return candidates
+            return await wait_for_hit(None) or []
+        finally:
+            # Lookups that lost the race still finish and fill the image cache; nobody awaits them,
+            # so retrieve their outcome to keep failures out of "exception was never retrieved"
+            for task in pending:
+                task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def resolve_slots(self, slots, stats, deadline, on_resolved=None, used=None):
+        # Plan the page: one lookup per normalized query, however many elements share it
+        slots_by_query = {}
+        for slot in slots:
+            slots_by_query.setdefault(ImageCache.normalize(slot.query) or slot.query, []).append(slot)
+        resolved = {}
+        # Images already on the page, so elements sharing a query (or a top hit) get different ones
+        used = set() if used is None else used
+
+        def assign(query, candidates):
+            for index, slot in enumerate(slots_by_query[query]):
+                unused = [url for url in candidates if url not in used]
+                if unused:
+                    image_url = unused[0]
+                elif candidates:
+                    image_url = candidates[index % len(candidates)]
+                else:
+                    image_url = IMAGE_PLACEHOLDER_URL
+                used.add(image_url)
+                resolved[slot.id] = image_url
+                if on_resolved:
+                    on_resolved(slot, image_url)
+
+        async def lookup(query):
+            candidates = await self.first_hit(fallback_queries(query), stats)
+            if not candidates:
+                print(f"No images found for query: {query}")
+            assign(query, candidates)
+
+        tasks = [asyncio.ensure_future(lookup(query)) for query in slots_by_query]
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        if pending:
+            # Late lookups still finish in the background and land in the image cache
+            print(f"[images] {len(pending)} queries missed the {deadline}s deadline")
+        for task in pending:
+            task.cancel()
+        for query, query_slots in slots_by_query.items():
+            if query_slots[0].id not in resolved:
+                assign(query, [])
+        return resolved
+
+    def submit(self, slots, stats, deadline=None, on_resolved=None, used=None):
+        """
+        Schedules resolution of the slots; the returned future yields {slot id: image URL}.
+        on_resolved(slot, url) is called from the resolver thread as each slot gets its image.
+        Pass the same used set for batches of one page so they don't repeat each other's images.
+        """
+        coroutine = self.resolve_slots(slots, stats, self.deadline if deadline is None else deadline, on_resolved, used)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.ensure_loop())
+
+    def resolve(self, slots, stats, deadline=None):
+        """Blocking form of submit()."""
+        return self.submit(slots, stats, deadline).result()
+
+
+image_resolver = ImageResolver(image_lookup_executor)
+
+
+def image_sources(slot, image_url, local=False):
+    """
+    (src, srcset) for a resolved slot: the thumbnail matching the slot's rendered width and,
+    for <img> tags, every width Commons can serve. local wraps them in genimg: URLs.
+    """
+    def wrap(url, width):
+        return local_image_url(url, width) if local else url
+
+    if slot.bg_url is not None:
+        return wrap(thumbnail_for_width(image_url, IMAGE_RENDER_WIDTH), IMAGE_RENDER_WIDTH), ""
+    width = rendered_width(slot)
+    srcset = ", ".join(f"{wrap(url, variant_width)} {variant_width}w"
+                       for variant_width, url in thumbnail_variants(image_url))
+    return wrap(thumbnail_for_width(image_url, width), width), srcset
+
+
+def set_image_layout_attributes(element):
+    """Responsive class, sizes hint and lazy loading for an <img> that gets a resolved image."""
+    if 'responsive-img' not in element.get('class', []):
+        element['class'] = element.get('class', []) + ['responsive-img']
+    element['sizes'] = image_sizes(element)
+    element['loading'] = 'lazy'
+
+
+def apply_image_urls(slots, image_urls):
+    """Writes resolved image URLs into the page in a single pass over the slots."""
+    for slot in slots:
+        image_url = image_urls.get(slot.id, IMAGE_PLACEHOLDER_URL)
+        src, srcset = image_sources(slot, image_url)
+        element = slot.element
+        if slot.bg_url is None:
+            print(f"Setting image for '{slot.query}': {src}")
+            element['src'] = src
+            if srcset:
+                element['srcset'] = srcset
+            set_image_layout_attributes(element)
+        else:
+            print(f"Setting background image for '{slot.query}': {src}")
+            # Replace the URL in the style
+            element['style'] = element['style'].replace(slot.bg_url, src)
+
+
+# URL scheme that serves cached, downscaled images to pages
+IMAGE_SCHEME = "genimg"
+
+# Shown in place of an image until its lookup finishes (no bare quotes, so it fits inside CSS url('...'))
+IMAGE_PENDING_SRC = ("data:image/svg+xml,%3Csvg xmlns=%27http://www.w3.org/2000/svg%27 width=%274%27 height=%273%27%3E"
+                     "%3Crect width=%274%27 height=%273%27 fill=%27%23bbb%27/%3E%3C/svg%3E")
+
+# Swaps resolved images into a rendered page
+IMAGE_PATCH_SCRIPT = """
+(function(patches) {
+    patches.forEach(function(patch) {
+        var attribute = patch.background ? 'data-gen-bg' : 'data-gen-img';
+        var element = document.querySelector('[' + attribute + '="' + patch.id + '"]');
+        if (!element) return;
+        if (patch.background) {
+            element.style.backgroundImage = 'url("' + patch.src + '")';
+        } else {
+            if (patch.srcset) element.srcset = patch.srcset;
+            element.src = patch.src;
+            element.classList.remove('gen-img-pending');
+        }
+    });
+})(%s);
+"""
+
+
+# Reports pending images as they near the viewport: "gen-img-visible:<slot ids>", closest first
+IMAGE_OBSERVER_SCRIPT = """
+new QWebChannel(qt.webChannelTransport, function(channel) {
+    var bridge = channel.objects.bridge;
+    var queued = [];
+    var timer = null;
+    function flush() {
+        timer = null;
+        queued.sort(function(a, b) { return a.distance - b.distance; });
+        bridge.send_to_python('gen-img-visible:' + queued.map(function(entry) { return entry.id; }).join(','));
+        queued = [];
+    }
+    var observer = new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            if (!entry.isIntersecting) return;
+            observer.unobserve(entry.target);
+            var rect = entry.boundingClientRect;
+            var distance = rect.bottom < 0 ? -rect.bottom : Math.max(0, rect.top - window.innerHeight);
+            var id = entry.target.getAttribute('data-gen-img') || entry.target.getAttribute('data-gen-bg');
+            queued.push({id: id, distance: distance});
+        });
+        if (queued.length && !timer) timer = setTimeout(flush, 50);
+    }, {rootMargin: '%s'});
+    document.querySelectorAll('[data-gen-img], [data-gen-bg]').forEach(function(element) {
+        observer.observe(element);
+    });
+});
+"""
+
+
+def mark_pending_images(slots):
+    """Gives each slot a stable data-gen-img/data-gen-bg id and a lightweight placeholder until its image resolves."""
+    for slot in slots:
+        element = slot.element
+        if slot.bg_url is None:
+            element['data-gen-img'] = str(slot.id)
+            element['src'] = IMAGE_PENDING_SRC
+            set_image_layout_attributes(element)
+            element['class'] = element['class'] + ['gen-img-pending']
+        else:
+            element['data-gen-bg'] = str(slot.id)
+            element['style'] = element['style'].replace(slot.bg_url, IMAGE_PENDING_SRC)
+
+
+def image_patch_script(patches):
+    """JavaScript that swaps resolved images into a rendered page; patches are (slot, url) pairs."""
+    payload = []
+    for slot, image_url in patches:
+        src, srcset = image_sources(slot, image_url, local=True)
+        payload.append({"id": slot.id, "background": slot.bg_url is not None, "src": src, "srcset": srcset})
+    return IMAGE_PATCH_SCRIPT % json.dumps(payload)
+
+
+def log_image_stats(slots, stats, lookup_start):
+    print(f"[images] {len(slots)} images, {len(set(ImageCache.normalize(slot.query) for slot in slots))} queries, "
+          f"{stats.cache_hits} cache hits, {stats.requests} Wikimedia requests in {time.time() - lookup_start:.2f}s")
+
+
+# Bundled libraries (in vendor/) served through the genlib: scheme: file name -> mime type
+LIBRARY_SCHEME = "genlib"
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vendor")
+VENDORED_LIBRARIES = {
+    "bootstrap.min.css": "text/css",
+    "bootstrap.bundle.min.js": "application/javascript",  # includes Popper.js 1
+    "jquery.min.js": "application/javascript",
+    "jquery.slim.min.js": "application/javascript",
+}
+# Scripts Qt ships as resources, served through genlib: as well so documents need no local (qrc:/file:) access
+QT_RESOURCE_LIBRARIES = {
+    "qwebchannel.js": ":/qtwebchannel/qwebchannel.js",
+}
+
+LIBRARY_VERSION_PATTERN = re.compile(r'(?:@|/|-)v?(\d+)\.\d+')
+
+
+def library_url(name):
+    return f"{LIBRARY_SCHEME}:{name}"
+
+
+def local_library_for(url):
+    """
+    The bundled file that can stand in for a CDN URL, "" if the bundle already covers it
+    (Popper 1 ships inside bootstrap.bundle.min.js), or None to leave the URL alone.
+    Only the major versions we bundle are rewritten, so a Bootstrap 5 page keeps its CDN.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https", "") or not parts.netloc:
+        return None
+    path = parts.path.lower()
+    filename = path.rsplit("/", 1)[-1]
+    version = LIBRARY_VERSION_PATTERN.search(path)
+    major = int(version.group(1)) if version else None
+    if filename in ("bootstrap.css", "bootstrap.min.css") and major == 4:
+        return "bootstrap.min.css"
+    if re.fullmatch(r'bootstrap(\.bundle)?(\.min)?\.js', filename) and major == 4:
+        return "bootstrap.bundle.min.js"
+    if re.fullmatch(r'popper(\.min)?\.js', filename) and major == 1:
+        return ""
+    if re.fullmatch(r'jquery(-[\d.]+)?(\.slim)?(\.min)?\.js', filename) and major == 3:
+        return "jquery.slim.min.js" if ".slim" in filename else "jquery.min.js"
+    return None
+
+
+def use_local_libraries(document):
+    """Points the page's CDN library tags at the bundled copies; returns {bundled file: its tag}."""
+    present = {}
+    for tag in document.libraries:
+        attribute = 'href' if tag.name == 'link' else 'src'
+        url = tag.get(attribute)
+        if not url or (tag.name == 'link' and 'stylesheet' not in (tag.get('rel') or [])):
+            continue
+        name = local_library_for(url.strip())
+        if name is None:
+            continue
+        if name == "" or name in present:
+            # Covered by the bundle, or the same file twice
+            tag.decompose()
+            continue
+        tag[attribute] = library_url(name)
+        # The CDN's subresource integrity hash doesn't describe our copy
+        for unused in ('integrity', 'crossorigin'):
+            if unused in tag.attrs:
+                del tag[unused]
+        present[name] = tag
+    return present
+
+
+class HtmlDocument:
+    """
+    A generated page parsed for rewriting. One traversal collects everything post-processing
+    touches: <img> tags, elements with a background-image style, <link>/<script> tags and link
+    targets (navigation links first). Subclasses wrap a parser; elements they hand out support
+    the parts of the bs4 Tag interface the rewriting helpers use.
+    """
+    NAV_TAGS = ('nav', 'header')
+
+    def __init__(self):
+        self.images = []
+        self.backgrounds = []
+        self.libraries = []
+        self.nav_links = []
+        self.page_links = []
+
+    @property
+    def links(self):
+        """Every link target in the page, the ones in navigation bars and headers first."""
+        return self.nav_links + self.page_links
+
+    def add_element(self, name, element, get):
+        if name == 'img':
+            self.images.append(element)
+        elif name in ('link', 'script'):
+            self.libraries.append(element)
+        style = get('style')
+        if style and BACKGROUND_IMAGE_PATTERN.search(style):
+            self.backgrounds.append(element)
+
+
+class SoupDocument(HtmlDocument):
+    """The pure-Python fallback: BeautifulSoup with html.parser."""
+    backend = "soup"
+
+    def __init__(self, html_content):
+        super().__init__()
+        self.soup = BeautifulSoup(html_content, 'html.parser')
+        for tag in self.soup.find_all(True):
+            self.add_element(tag.name, tag, tag.get)
+            if tag.name == 'a' and tag.get('href') is not None:
+                if tag.find_parent(self.NAV_TAGS):
+                    self.nav_links.append(tag['href'])
+                self.page_links.append(tag['href'])
+
+    def new_tag(self, name, string=None, **attrs):
+        tag = self.soup.new_tag(name, **attrs)
+        if string is not None:
+            tag.string = string
+        return tag
+
+    def append_to_head(self, tags):
+        if self.soup.head:
+            for tag in tags:
+                self.soup.head.append(tag)
+        else:
+            # If there's no <head>, create one
+            head_tag = self.soup.new_tag('head')
+            for tag in tags:
+                head_tag.append(tag)
+            self.soup.insert(0, head_tag)
+
+    def append_to_body(self, tags):
+        if self.soup.body:
+            for tag in tags:
+                self.soup.body.append(tag)
+        else:
+            # If there's no <body>, create one
+            body_tag = self.soup.new_tag('body')
+            for tag in tags:
+                body_tag.append(tag)
+            self.soup.insert(len(self.soup.contents), body_tag)
+
+    def serialize(self):
+        return str(self.soup)
+
+
+class LxmlElement:
+    """An lxml element behind the slice of the bs4 Tag interface the rewriting helpers use."""
+    MULTI_VALUED = ('class', 'rel')
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def name(self):
+        return self.element.tag
+
+    @property
+    def attrs(self):
+        return self.element.attrib
+
+    @property
+    def parents(self):
+        return (LxmlElement(parent) for parent in self.element.iterancestors())
+
+    def get(self, key, default=None):
+        value = self.element.get(key)
+        if value is None:
+            return default
+        # Like bs4, class and rel are lists of names
+        return value.split() if key in self.MULTI_VALUED else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.element.set(key, " ".join(value) if isinstance(value, list) else value)
+
+    def __delitem__(self, key):
+        del self.element.attrib[key]
+
+    def insert_before(self, other):
+        self.element.addprevious(other.element)
+
+    def decompose(self):
+        # drop_tree keeps the text that followed the element
+        self.element.drop_tree()
+
+
+DOCTYPE_PATTERN = re.compile(r'\s*<!doctype', re.IGNORECASE)
+
+
+class LxmlDocument(HtmlDocument):
+    """The fast path: lxml's C parser and serializer."""
+    backend = "lxml"
+
+    def __init__(self, html_content):
+        super().__init__()
+        self.root = lxml.html.document_fromstring(html_content)
+        # libxml2 reports an HTML 4 doctype for pages without one, which would switch them to quirks mode
+        self.doctype = self.root.getroottree().docinfo.doctype if DOCTYPE_PATTERN.match(html_content) else None
+        # Elements only, no comments or processing instructions
+        for element in self.root.iter(lxml.etree.Element):
+            name = element.tag
+            self.add_element(name, LxmlElement(element), element.get)
+            if name == 'a' and element.get('href') is not None:
+                if any(parent.tag in self.NAV_TAGS for parent in element.iterancestors()):
+                    self.nav_links.append(element.get('href'))
+                self.page_links.append(element.get('href'))
+
+    def new_tag(self, name, string=None, **attrs):
+        element = lxml.html.Element(name, attrs)
+        element.text = string
+        return LxmlElement(element)
+
+    def section(self, name, index):
+        section = self.root.find(name)
+        if section is None:
+            section = lxml.html.Element(name)
+            self.root.insert(index, section)
+        return section
+
+    def append_to_head(self, tags):
+        head = self.section('head', 0)
+        for tag in tags:
+            head.append(tag.element)
+
+    def append_to_body(self, tags):
+        body = self.section('body', len(self.root))
+        for tag in tags:
+            body.append(tag.element)
+
+    def serialize(self):
+        return lxml.html.tostring(self.root, encoding='unicode', doctype=self.doctype)
+
+
+def parse_page(html_content, rewriter=None):
+    """
+    Parses a page for post-processing with the HTML_REWRITER backend. Falls back to
+    html.parser when lxml isn't installed or can't take the document.
+    """
+    if (rewriter or HTML_REWRITER) == "lxml" and lxml is not None:
+        try:
+            return LxmlDocument(html_content)
+        except (ValueError, lxml.etree.LxmlError) as e:
+            print(f"lxml could not parse the page ({e}), using html.parser")
+    return SoupDocument(html_content)
+
+
+def post_process_html(html_content, topic, defer_images=False, observe_images=False, local_libraries=False,
+                      rewriter=None):
+    """
+    Replaces image placeholders in a generated page with Wikimedia Commons images
+    and injects the responsive styles and Bootstrap/jQuery/Popper tags.
+    With defer_images the page gets pending placeholders instead and the caller
+    resolves the returned image slots itself; observe_images also adds the script
+    that reports them as they scroll into view. local_libraries uses the bundled
+    libraries (genlib: URLs) instead of CDNs, for pages shown inside the browser.
+    rewriter overrides HTML_REWRITER. Returns the final HTML, the HtmlDocument and the image slots.
+    """
+    # Parse the HTML and replace image placeholders with actual URLs
+    document = parse_page(html_content, rewriter)
+    image_slots = collect_image_slots(document, topic)
+
+    if defer_images:
+        mark_pending_images(image_slots)
+    elif image_slots:
+        stats = ImageLookupStats()
+        lookup_start = time.time()
+        apply_image_urls(image_slots, image_resolver.resolve(image_slots, stats))
+        log_image_stats(image_slots, stats, lookup_start)
+
+    # Inject CSS styles for responsive images and containers
+    style_tag = document.new_tag('style', string="""
+    img.responsive-img {
+        max-width: 100%;
+        height: auto;
+        display: block;
+    }
+    .container, .content-container, .content-section {
+        width: 100%;
+        overflow: hidden;
+    }
+    img.gen-img-pending {
+        animation: gen-img-pulse 1.2s ease-in-out infinite alternate;
+    }
+    @keyframes gen-img-pulse {
+        from { opacity: 0.35; }
+        to { opacity: 0.8; }
+    }
+    """)
+    if local_libraries:
+        # Bundled copies served from memory; the page's own CDN links are pointed at them too
+        present = use_local_libraries(document)
+        head_tags = [style_tag]
+        if "bootstrap.min.css" not in present:
+            head_tags.append(document.new_tag('link', rel='stylesheet', href=library_url("bootstrap.min.css")))
+        scripts = []
+        if not present.keys() & {"jquery.min.js", "jquery.slim.min.js"}:
+            jquery_js = document.new_tag('script', src=library_url("jquery.slim.min.js"))
+            if "bootstrap.bundle.min.js" in present:
+                # Bootstrap 4 needs jQuery loaded before it
+                present["bootstrap.bundle.min.js"].insert_before(jquery_js)
+            else:
+                scripts.append(jquery_js)
+        if "bootstrap.bundle.min.js" not in present:
+            scripts.append(document.new_tag('script', src=library_url("bootstrap.bundle.min.js")))
+    else:
+        # Include external CSS libraries
+        bootstrap_css = document.new_tag('link', rel='stylesheet', href='https://stackpath.bootstrapcdn.com/bootstrap/4.5.3/css/bootstrap.min.css')
+        # Include external JS libraries
+        bootstrap_js = document.new_tag('script', src='https://stackpath.bootstrapcdn.com/bootstrap/4.5.3/js/bootstrap.min.js')
+
+        jquery_js = document.new_tag('script', src='https://code.jquery.com/jquery-3.5.1.slim.min.js')
+
+        popper_js = document.new_tag('script', src='https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js')
+
+        head_tags = [style_tag, bootstrap_css]
+        scripts = [jquery_js, popper_js, bootstrap_js]
+
+    document.append_to_head(head_tags)
+
+    if defer_images and observe_images and image_slots:
+        scripts.append(document.new_tag('script', src=library_url("qwebchannel.js")))
+        scripts.append(document.new_tag('script', string=IMAGE_OBSERVER_SCRIPT % LAZY_IMAGE_MARGIN))
+
+    # Append scripts before closing body tag
+    document.append_to_body(scripts)
+
+    return document.serialize(), document, image_slots
+
+
+# The inside of a tag: a '>' in a quoted attribute value does not end it
+TAG_BODY = r"""(?:"[^"]*"|'[^']*'|[^'">])*"""
+# Comments, raw-text elements (kept whole, like the browser parses them) and <link> tags
+MINIFY_TOKEN_PATTERN = re.compile(r'<!--.*?-->|(<(pre|textarea|script|style)\b' + TAG_BODY + r'>).*?(?:</\2\s*>|$)'
+                                  r'|<link\b' + TAG_BODY + r'>', re.IGNORECASE | re.DOTALL)
+# Any other tag, copied as it is; an unterminated quote or tag runs to the end, as in the browser
+HTML_TAG_PATTERN = re.compile(r"""<[A-Za-z/!?](?:"[^"]*(?:"|\Z)|'[^']*(?:'|\Z)|[^'">])*(?:>|\Z)""")
+# Only ASCII whitespace collapses in HTML; a non-breaking space must survive
+HTML_LINE_BREAK_PATTERN = re.compile(r'[ \t\r\f]*\n[ \t\n\r\f]*')
+HTML_SPACES_PATTERN = re.compile(r'[ \t\r\f]{2,}|[\t\r\f]')
+CSS_STRING_OR_COMMENT_PATTERN = re.compile(r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|/\*.*?(?:\*/|$)', re.DOTALL)
+SCRIPT_TYPE_PATTERN = re.compile(r'\btype\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+
+
+def collapse_whitespace(text):
+    """Whitespace runs become one space, or one line break if they span lines."""
+    return HTML_SPACES_PATTERN.sub(" ", HTML_LINE_BREAK_PATTERN.sub("\n", text))
+
+
+def collapse_text(html):
+    """collapse_whitespace for the text between tags; tags and their attribute values are left alone."""
+    pieces = []
+    position = 0
+    for match in HTML_TAG_PATTERN.finditer(html):
+        pieces.append(collapse_whitespace(html[position:match.start()]))
+        pieces.append(match.group(0))
+        position = match.end()
+    pieces.append(collapse_whitespace(html[position:]))
+    return "".join(pieces)
+
+
+def squeeze_css(css):
+    css = re.sub(r'[ \t\n\r\f]+', ' ', css)
+    # Spaces around + and - stay: calc() needs them
+    css = re.sub(r' ?([{};,>]) ?', r'\1', css)
+    return css.replace(': ', ':').replace(';}', '}')
+
+
+def minify_css(css):
+    """Drops comments and spare whitespace from a stylesheet, leaving strings alone."""
+    pieces = []
+    pending = []
+    position = 0
+    for match in CSS_STRING_OR_COMMENT_PATTERN.finditer(css):
+        pending.append(css[position:match.start()])
+        if match.group(1):
+            pieces.append(squeeze_css("".join(pending)))
+            pieces.append(match.group(1))
+            pending = []
+        else:
+            # A comment still separates what is around it
+            pending.append(" ")
+        position = match.end()
+    pending.append(css[position:])
+    pieces.append(squeeze_css("".join(pending)))
+    return "".join(pieces).strip()
+
+
+def block_comment_open(line, in_comment):
+    """
+    Whether a /* comment is still open after line. Strings are not parsed, so a "/*"
+    in one only makes the caller keep more than it needs to.
+    """
+    position = 0
+    while True:
+        index = line.find("*/" if in_comment else "/*", position)
+        if index == -1:
+            return in_comment
+        in_comment = not in_comment
+        position = index + 2
+
+
+def minify_js(js):
+    """
+    Strips indentation, blank lines and whole-line // comments, keeping every line
+    break so ASI is unaffected. A line after one ending in a backslash may be the
+    rest of a string and is kept exactly; a // line that may sit inside a /* comment
+    (where it could hold the closing */) is kept too. Scripts with template literals,
+    whose line breaks may be content, are kept as they are.
+    """
+    if '`' in js:
+        return js
+    lines = []
+    continued = in_comment = False
+    for raw_line in js.splitlines():
+        line = raw_line if continued else raw_line.strip()
+        if not continued and (not line or (line.startswith('//') and not in_comment)):
+            continue
+        lines.append(line)
+        continued = line.endswith('\\')
+        in_comment = block_comment_open(line, in_comment)
+    return "\n".join(lines)
+
+
+def minify_token(match):
+    """(kind, dedupe key, text) for one MINIFY_TOKEN_PATTERN match."""
+    text = match.group(0)
+    element = (match.group(2) or "").lower()
+    if text.startswith('<!--'):
+        # Conditional comments are markup for old IE, the rest can go
+        return ("text", None, text if text.startswith(('<!--[if', '<!--<![endif')) else "")
+    if not element:
+        return ("style", text, text) if 'stylesheet' in text.lower() else ("text", None, text)
+    open_end = len(match.group(1))
+    close_start = text.rfind('</')
+    if element in ('pre', 'textarea') or close_start < open_end:
+        # Preformatted, or unterminated markup that is safest left exactly as it came
+        return ("text", None, text)
+    open_tag = text[:open_end]
+    body = text[open_end:close_start]
+    close_tag = text[close_start:]
+    if element == 'style':
+        style = open_tag + minify_css(body) + close_tag
+        return ("style", style, style)
+    if not body.strip():
+        return ("script", open_tag, open_tag + close_tag)
+    script_type = SCRIPT_TYPE_PATTERN.search(open_tag)
+    if script_type and script_type.group(1).lower() not in ("text/javascript", "application/javascript", "module"):
+        # JSON data, templates and the like
+        return ("text", None, text)
+    return ("text", None, open_tag + minify_js(body) + close_tag)
+
+
+def minify_html(html):
+    """
+    Regex minifier for generated pages that copes with broken markup: drops comments,
+    collapses whitespace in the text between tags outside <pre>, <textarea>, <script>
+    and <style> (tags are copied as they are, attribute values included), minifies
+    CSS and (conservatively) inline JS, and removes repeated stylesheets and scripts.
+    A repeated stylesheet keeps its last occurrence, which leaves the cascade as it
+    was; a repeated external script keeps its first, so libraries aren't loaded twice.
+    """
+    tokens = []
+    position = 0
+    for match in MINIFY_TOKEN_PATTERN.finditer(html):
+        tokens.append(("text", None, collapse_text(html[position:match.start()])))
+        tokens.append(minify_token(match))
+        position = match.end()
+    tokens.append(("text", None, collapse_text(html[position:])))
+
+    remaining_styles = Counter(key for kind, key, _ in tokens if kind == "style")
+    loaded_scripts = set()
+    pieces = []
+    for kind, key, text in tokens:
+        if kind == "style":
+            remaining_styles[key] -= 1
+            if remaining_styles[key]:
+                continue
+        elif kind == "script":
+            if key in loaded_scripts:
+                continue
+            loaded_scripts.add(key)
+        pieces.append(text)
+    return "".join(pieces).strip()
+
+
+def minify_page(html, label=""):
+    """minify_html when MINIFY_HTML is on, logging the bytes saved. Falls back to the page as it was."""
+    if not MINIFY_HTML or not html:
+        return html
+    try:
+        minified = minify_html(html)
+    except Exception as e:
+        print(f"[minify] {label}: skipped ({e})")
+        return html
+    before, after = len(html.encode("utf-8")), len(minified.encode("utf-8"))
+    print(f"[minify] {label}: {before} -> {after} bytes, {before - after} saved ({(before - after) / before:.0%})")
+    return minified
+
+
+class ImageBlobStore:
+    """
+    Content-addressed, size-bounded LRU store of image bytes on disk. Source URLs
+    (and their downscaled variants) map to blobs named after the SHA-256 of their bytes.
+    The index lives in memory; it is written to disk after evictions, at most every
+    index_flush_interval seconds while it has changes, and at exit.
+    """
+    def __init__(self, blob_dir=IMAGE_BLOB_DIR, max_bytes=IMAGE_BLOB_MAX_BYTES,
+                 index_flush_interval=IMAGE_BLOB_INDEX_FLUSH_INTERVAL):
+        self.blob_dir = blob_dir
+        self.max_bytes = max_bytes
+        self.index_flush_interval = index_flush_interval
+        self.lock = threading.Lock()
+        self.index_path = os.path.join(blob_dir, "index.json")
+        os.makedirs(blob_dir, exist_ok=True)
+        self.index = self.load_index()
+        # Reverse map so dropping a blob does not scan every source
+        self.digest_sources = {}
+        for source, digest in self.index["sources"].items():
+            self.digest_sources.setdefault(digest, set()).add(source)
+        self.total_bytes = sum(blob["size"] for blob in self.index["blobs"].values())
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+            return {"sources": index.get("sources", {}), "blobs": index.get("blobs", {})}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"sources": {}, "blobs": {}}
+
+    def save_index(self):
+        try:
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(self.index, file)
+            os.replace(temp_path, self.index_path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Failed to save image store index: {e}")
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        """Write the index to disk if it changed since the last write."""
+        with self.lock:
+            if self.dirty:
+                self.save_index()
+
+    def mark_dirty(self):
+        # Called with the lock held; access times alone never cost more than one write per interval
+        self.dirty = True
+        if time.monotonic() - self.last_flush >= self.index_flush_interval:
+            self.save_index()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+
+    def get(self, source):
+        """Return (bytes, mime type) stored for the source key, or None."""
+        with self.lock:
+            digest = self.index["sources"].get(source)
+            blob = self.index["blobs"].get(digest)
+            if blob is None:
+                return None
+            try:
+                with open(self.blob_path(digest), "rb") as file:
+                    data = file.read()
+            except OSError:
+                self.remove(digest)
+                self.mark_dirty()
+                return None
+            blob["accessed"] = time.time()
+            self.mark_dirty()
+            return data, blob["mime"]
+
+    def put(self, source, data, mime):
+        """Store bytes for the source key and evict least recently used blobs past max_bytes."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            if digest not in self.index["blobs"]:
+                try:
+                    with open(self.blob_path(digest), "wb") as file:
+                        file.write(data)
+                except OSError as e:
+                    print(f"Failed to write image blob: {e}")
+                    return
+                self.total_bytes += len(data)
+            self.index["blobs"][digest] = {"size": len(data), "mime": mime, "accessed": time.time()}
+            previous = self.index["sources"].get(source)
+            if previous is not None and previous != digest:
+                self.digest_sources.get(previous, set()).discard(source)
+            self.index["sources"][source] = digest
+            self.digest_sources.setdefault(digest, set()).add(source)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+                self.save_index()
+            else:
+                self.mark_dirty()
+
+    def remove(self, digest):
+        blob = self.index["blobs"].pop(digest, None)
+        if blob is not None:
+            self.total_bytes -= blob["size"]
+        for source in self.digest_sources.pop(digest, ()):
+            if self.index["sources"].get(source) == digest:
+                del self.index["sources"][source]
+        try:
+            os.remove(self.blob_path(digest))
+        except OSError:
+            pass
+
+    def evict(self):
+        blobs = self.index["blobs"]
+        for digest in sorted(blobs, key=lambda d: blobs[d]["accessed"]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.remove(digest)
+
+
+def image_source_allowed(image_url):
+    """Whether the genimg: scheme may download image_url: http(s) on one of IMAGE_SOURCE_HOSTS."""
+    parts = urlsplit(image_url)
+    return parts.scheme in ("http", "https") and parts.hostname in IMAGE_SOURCE_HOSTS
+
+
+def local_image_url(image_url, width=None):
+    """
+    The genimg: URL that serves image_url from the blob store, downscaled to width pixels.
+    Images from other hosts (the placeholder, say) are left for the page to load itself.
+    """
+    if not image_source_allowed(image_url):
+        return image_url
+    return f"{IMAGE_SCHEME}:image?w={width or IMAGE_RENDER_WIDTH}&src={quote(image_url, safe='')}"
+
+
+def rendered_width(slot):
+    """Width the page asks for in the <img> width attribute, if it is a plain pixel count."""
+    width = str(slot.element.get('width', '')).strip().lower().replace('px', '')
+    if slot.bg_url is None and width.isdigit() and 0 < int(width) < IMAGE_RENDER_WIDTH:
+        return int(width)
+    return IMAGE_RENDER_WIDTH
+
+
+def downscale_image(data, width):
+    """Re-encodes image bytes at most width pixels wide; returns (bytes, mime) or None if not worth it."""
+    image = QImage()
+    if not image.loadFromData(data) or image.width() <= width:
+        return None
+    scaled = image.scaledToWidth(width, Qt.SmoothTransformation)
+    image_format = "PNG" if scaled.hasAlphaChannel() else "JPEG"
+    output = QByteArray()
+    buffer = QBuffer(output)
+    buffer.open(QIODevice.WriteOnly)
+    scaled.save(buffer, image_format, 85)
+    buffer.close()
+    return bytes(output), f"image/{image_format.lower()}"
+
+
+def load_local_image(store, source_url, width):
+    """
+    Returns (bytes, mime) for source_url at the given width, downloading the original
+    only the first time. Runs on a worker thread (QImage is safe off the GUI thread).
+    """
+    variant_key = f"{source_url}#w{width}"
+    cached = store.get(variant_key)
+    if cached:
+        return cached
+    original = store.get(source_url)
+    if original is None:
+        response = http_client.get(source_url)
+        mime = response.headers.get("Content-Type", "").split(";")[0].strip()
+        if response.status_code != 200 or not mime.startswith("image/"):
+            raise ValueError(f"{response.status_code} {mime or 'unknown type'}")
+        original = (response.content, mime)
+        store.put(source_url, *original)
+    # Animated and vector images are served as they are
+    scaled = None
+    if original[1] not in ("image/gif", "image/svg+xml"):
+        scaled = downscale_image(original[0], width)
+    result = scaled or original
+    store.put(variant_key, *result)
+    return result
+
+
+# URL scheme pages are loaded from instead of setHtml: gen://docs/<id>
+DOCUMENT_SCHEME = "gen"
+DOCUMENT_URL_PREFIX = f"{DOCUMENT_SCHEME}://docs/"
+
+
+class DocumentStore:
+    """
+    In-memory, size-bounded LRU store of rendered documents, served by DocumentSchemeHandler.
+    Each document is encoded once and loaded by URL, so pages of any size render and keep
+    their place in the tab's history.
+    """
+    def __init__(self, max_bytes=DOCUMENT_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.documents = OrderedDict()
+        self.size = 0
+        self.next_id = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def put(self, html, url=None):
+        """Stores html and returns its gen:// URL; passing the URL of an earlier document replaces it."""
+        data = html.encode("utf-8")
+        with self.lock:
+            if url is None or not url.startswith(DOCUMENT_URL_PREFIX):
+                url = f"{DOCUMENT_URL_PREFIX}{next(self.next_id)}"
+            doc_id = url[len(DOCUMENT_URL_PREFIX):]
+            self.size -= len(self.documents.pop(doc_id, b""))
+            self.documents[doc_id] = data
+            self.size += len(data)
+            # Always keep the newest document, however large
+            while self.size > self.max_bytes and len(self.documents) > 1:
+                _, dropped = self.documents.popitem(last=False)
+                self.size -= len(dropped)
+        return url
+
+    def remove(self, url):
+        """Forgets the document behind a gen:// URL, if it is still stored."""
+        if url.startswith(DOCUMENT_URL_PREFIX):
+            with self.lock:
+                self.size -= len(self.documents.pop(url[len(DOCUMENT_URL_PREFIX):], b""))
+
+    def get(self, doc_id):
+        with self.lock:
+            data = self.documents.get(doc_id)
+            if data is not None:
+                self.documents.move_to_end(doc_id)
+            return data
+
+
+document_store = DocumentStore()
+
+
+def load_document(view, html, url=None):
+    """Shows html in a QWebEngineView through the document store instead of setHtml; returns its URL."""
+    url = document_store.put(html, url)
+    view.setUrl(QUrl(url))
+    return url
+
+
+def register_url_schemes():
+    """Registers the genimg:, genlib: and gen:// schemes; must run before the QApplication is created."""
+    for name in (IMAGE_SCHEME, LIBRARY_SCHEME):
+        scheme = QWebEngineUrlScheme(name.encode())
+        scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+        scheme.setFlags(QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.CorsEnabled)
+        QWebEngineUrlScheme.registerScheme(scheme)
+    # Documents resolve relative links against gen://docs/; they get no local file access, and load
+    # qwebchannel.js through genlib: like the other libraries
+    scheme = QWebEngineUrlScheme(DOCUMENT_SCHEME.encode())
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    QWebEngineUrlScheme.registerScheme(scheme)
 
 
 class WebBridge(QObject):
@@ -88,7 +2372,7 @@ class ChatDialog(QDialog):
             try:
                 ai_prompt = f"You are a web assistant. Modify the following HTML/JavaScript based on the user's request:\n\n{message}"
                 print("Sending chat request to Ollama client...")
-                response = ollama_client.chat(
+                response = get_ollama_pool().chat(
                     model=self.parent().current_model,
                     messages=[
                         {"role": "system", "content": "You are an assistant that helps edit HTML and JavaScript code."},
@@ -134,7 +2418,8 @@ class ShowCodeDialog(QDialog):
     def save_changes(self):
         """Apply the edited code back to the web view."""
         edited_html = self.code_display.toPlainText()
-        self.web_view.setHtml(edited_html)
+        # A new document, so Back returns to the unedited page
+        load_document(self.web_view, edited_html)
         self.close()
 
 
@@ -201,14 +2486,58 @@ class BookmarksDialog(QDialog):
 
 class CustomWebEnginePage(QWebEnginePage):
     """Custom QWebEnginePage to intercept navigation requests."""
-    def __init__(self, parent=None, browser=None, base_topic="", base_design=""):
+    def __init__(self, parent=None, browser=None, base_topic="", base_design="", design_fingerprint=""):
         super().__init__(parent)
         self.browser = browser
         self.base_topic = base_topic
         self.base_design = base_design
+        # extract_design_fingerprint(base_design), computed once off the GUI thread
+        self.design_fingerprint = design_fingerprint
+        # Images resolved after the page was rendered, replayed whenever the document (re)loads
+        self.image_render = 0
+        self.image_patches = []
+        # Lazy mode: slots waiting to scroll into view, and the images the page already shows
+        self.lazy_image_slots = {}
+        self.images_used = set()
+        self.loadFinished.connect(self.replay_image_patches)
+        # gen:// URL of the generated page; streamed renders and the final page replace one another there
+        self.document_url = None
+
+    def start_image_render(self, lazy_slots=()):
+        """Starts a new document; patches for earlier renders are ignored from now on."""
+        self.image_render += 1
+        self.image_patches = []
+        self.lazy_image_slots = {slot.id: slot for slot in lazy_slots}
+        self.images_used = set()
+        return self.image_render
+
+    def close_document(self):
+        """Drops the pending render state and stored document of a page whose tab is closing."""
+        self.start_image_render()
+        if self.document_url:
+            document_store.remove(self.document_url)
+            self.document_url = None
+
+    def take_lazy_image_slots(self, slot_ids):
+        """Removes and returns the still unresolved slots among slot_ids, in the given order."""
+        return [self.lazy_image_slots.pop(slot_id) for slot_id in slot_ids if slot_id in self.lazy_image_slots]
+
+    def patch_image(self, render, slot, image_url):
+        if render != self.image_render:
+            return
+        self.image_patches.append((slot, image_url))
+        self.runJavaScript(image_patch_script([(slot, image_url)]))
+
+    def replay_image_patches(self, ok):
+        # Patches that arrived while the document was still loading never found their element
+        if ok and self.image_patches:
+            self.runJavaScript(image_patch_script(self.image_patches))
 
     def acceptNavigationRequest(self, url, _type, isMainFrame):
         if _type == QWebEnginePage.NavigationTypeLinkClicked:
+            if url.hasFragment() and url.adjusted(QUrl.RemoveFragment) == self.url().adjusted(QUrl.RemoveFragment):
+                # In-page anchor of the current document
+                return super().acceptNavigationRequest(url, _type, isMainFrame)
             url_str = url.toString()
             # Determine if the link is internal or external
             if url_str.startswith("http") or url_str.startswith("www"):
@@ -217,14 +2546,172 @@ class CustomWebEnginePage(QWebEnginePage):
             else:
                 # Internal link
                 link_text = url.toString()
-                self.browser.generate_internal_page(self.base_topic, link_text, self.base_design)
+                self.browser.generate_internal_page(self.base_topic, link_text, self.base_design,
+                                                    self.design_fingerprint)
             return False  
         return super().acceptNavigationRequest(url, _type, isMainFrame)
 
 
+class ImageSchemeHandler(QWebEngineUrlSchemeHandler):
+    """
+    Serves genimg: URLs from the image blob store. Downloads and downscaling run on
+    worker threads; the reply goes back to the job on the GUI thread.
+    """
+    job_done = pyqtSignal(object, bytes, str, str)  # job, data, mime, source url
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS, thread_name_prefix="image-download")
+        # Jobs still waiting for their bytes; Qt deletes a job when its page goes away
+        self.jobs = set()
+        self.job_done.connect(self.finish_job)
+
+    def requestStarted(self, job):
+        query = parse_qs(urlsplit(bytes(job.requestUrl().toEncoded()).decode("ascii")).query)
+        source_url = query.get("src", [""])[0]
+        if not source_url.startswith(("http://", "https://")):
+            job.fail(QWebEngineUrlRequestJob.UrlInvalid)
+            return
+        if not image_source_allowed(source_url):
+            # Generated pages must not make the browser process fetch arbitrary (local or LAN) hosts
+            job.fail(QWebEngineUrlRequestJob.RequestDenied)
+            return
+        try:
+            width = max(1, min(int(query.get("w", [IMAGE_RENDER_WIDTH])[0]), IMAGE_RENDER_WIDTH))
+        except ValueError:
+            width = IMAGE_RENDER_WIDTH
+        self.jobs.add(job)
+        job.destroyed.connect(lambda: self.jobs.discard(job))
+        self.executor.submit(self.load, job, source_url, width)
+
+    def load(self, job, source_url, width):
+        try:
+            data, mime = load_local_image(self.store, source_url, width)
+        except Exception as e:
+            print(f"Failed to load image {source_url}: {e}")
+            data, mime = b"", ""
+        self.job_done.emit(job, data, mime, source_url)
+
+    def finish_job(self, job, data, mime, source_url):
+        if job not in self.jobs:
+            return
+        self.jobs.discard(job)
+        if not data:
+            # Let the page try the original URL itself
+            job.redirect(QUrl(source_url))
+            return
+        buffer = QBuffer(job)
+        buffer.setData(data)
+        buffer.open(QIODevice.ReadOnly)
+        job.reply(mime.encode("ascii"), buffer)
+
+
+class DocumentSchemeHandler(QWebEngineUrlSchemeHandler):
+    """Serves rendered documents (gen://docs/<id> URLs) from a DocumentStore."""
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+
+    def requestStarted(self, job):
+        data = self.store.get(job.requestUrl().path().strip("/"))
+        if data is None:
+            # Dropped from the store, or a link that was never a document
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+        buffer = QBuffer(job)
+        buffer.setData(data)
+        buffer.open(QIODevice.ReadOnly)
+        job.reply(b"text/html;charset=utf-8", buffer)
+
+
+class LibrarySchemeHandler(QWebEngineUrlSchemeHandler):
+    """Serves the bundled libraries (genlib: URLs) from memory."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = {}
+
+    def requestStarted(self, job):
+        name = job.requestUrl().path()
+        if name in QT_RESOURCE_LIBRARIES:
+            mime = "application/javascript"
+        elif name in VENDORED_LIBRARIES:
+            mime = VENDORED_LIBRARIES[name]
+        else:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+        if name not in self.cache:
+            data = self.load(name)
+            if data is None:
+                job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+                return
+            self.cache[name] = data
+        buffer = QBuffer(job)
+        buffer.setData(self.cache[name])
+        buffer.open(QIODevice.ReadOnly)
+        job.reply(mime.encode("ascii"), buffer)
+
+    @staticmethod
+    def load(name):
+        """The bytes of a bundled library, from vendor/ or Qt's resources; None if it can't be read."""
+        if name in QT_RESOURCE_LIBRARIES:
+            resource = QFile(QT_RESOURCE_LIBRARIES[name])
+            if not resource.open(QIODevice.ReadOnly):
+                print(f"Failed to load Qt resource {resource.fileName()}: {resource.errorString()}")
+                return None
+            try:
+                return bytes(resource.readAll())
+            finally:
+                resource.close()
+        try:
+            with open(os.path.join(VENDOR_DIR, name), "rb") as file:
+                return file.read()
+        except OSError as e:
+            print(f"Failed to load bundled library {name}: {e}")
+            return None
+
+
+# A page post-processed off the GUI thread, ready to be shown in its tab; source_html is the page
+# as the model wrote it, before libraries, image placeholders and their CSS were injected, and
+# design_fingerprint its fingerprint when the page is a site's main page (else "")
+ProcessedPage = namedtuple("ProcessedPage",
+                           "page lazy html document image_slots worker_seconds source_html design_fingerprint")
+
+
+class GuiStallMonitor(QObject):
+    """Measures how long the GUI thread goes without processing events, from the lateness of a timer."""
+    def __init__(self, interval=50, parent=None):
+        super().__init__(parent)
+        self.interval = interval / 1000
+        self.max_stall = 0.0
+        self.total_stall = 0.0
+        self.stalls = 0
+        self.last_tick = time.perf_counter()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(interval)
+
+    def tick(self):
+        now = time.perf_counter()
+        stall = now - self.last_tick - self.interval
+        self.last_tick = now
+        if stall > GUI_STALL_THRESHOLD:
+            self.stalls += 1
+            self.total_stall += stall
+            self.max_stall = max(self.max_stall, stall)
+            if stall > 0.5:
+                print(f"[gui] Event loop stalled for {stall:.2f}s")
+
+    def snapshot(self):
+        return {"stalls": self.stalls, "total_stall": round(self.total_stall, 3), "max_stall": round(self.max_stall, 3)}
+
+
 class SignalCommunicator(QObject):
     """A helper class to define custom signals."""
-    html_ready_signal = pyqtSignal(str, str)  
+    html_ready_signal = pyqtSignal(object, str)  # tab, html
+    html_partial_signal = pyqtSignal(object, str)  # tab, html
+    image_ready_signal = pyqtSignal(object, int, object, str)  # page, render, image slot, url
+    html_processed_signal = pyqtSignal(object, object)  # tab, ProcessedPage
 
 
 class ClosableTabBar(QTabBar):
@@ -257,7 +2744,8 @@ class ClosableTabBar(QTabBar):
             rect = self.tabRect(index)
             close_rect = QRect(rect.right() - 20, rect.top() + (rect.height() - 16) // 2, 16, 16)
             if close_rect.contains(event.pos()):
-                self.parent().removeTab(index)  
+                # The browser removes the tab and cancels its generation
+                self.tabCloseRequested.emit(index)
                 return
         super().mousePressEvent(event)
 
@@ -290,7 +2778,7 @@ class GenerativeBrowser(QMainWindow):
             "phi3.5": ["phi3.5"],
             "codegemma": ["codegemma"]
         }
-        self.current_model = "qwen2.5"
+        self.current_model = DEFAULT_MODEL
 
         # Create main layout
         self.central_widget = QWidget()
@@ -373,10 +2861,44 @@ class GenerativeBrowser(QMainWindow):
 
         # Connect custom signal to a slot function for real-time updates
         self.signal_communicator.html_ready_signal.connect(self.set_html_in_tab)
+        self.signal_communicator.html_partial_signal.connect(self.set_partial_html_in_tab)
+        self.signal_communicator.image_ready_signal.connect(self.patch_image_in_page)
+        self.signal_communicator.html_processed_signal.connect(self.show_processed_html)
+
+        # Pages are parsed, rewritten and serialized here, never on the GUI thread
+        self.post_process_executor = ThreadPoolExecutor(max_workers=POST_PROCESS_WORKERS, thread_name_prefix="post-process")
+        self.stall_monitor = GuiStallMonitor(parent=self)
+
+        # Serve page images from the local blob store
+        self.image_scheme_handler = ImageSchemeHandler(ImageBlobStore(), self)
+        QWebEngineProfile.defaultProfile().installUrlSchemeHandler(IMAGE_SCHEME.encode(), self.image_scheme_handler)
+
+        # Serve Bootstrap/jQuery to pages from memory instead of CDNs
+        self.library_scheme_handler = LibrarySchemeHandler(self)
+        QWebEngineProfile.defaultProfile().installUrlSchemeHandler(LIBRARY_SCHEME.encode(), self.library_scheme_handler)
+        # Serves the documents tabs are loaded from
+        self.document_scheme_handler = DocumentSchemeHandler(document_store, self)
+        QWebEngineProfile.defaultProfile().installUrlSchemeHandler(DOCUMENT_SCHEME.encode(), self.document_scheme_handler)
 
         # Store base designs for sites
         self.site_designs = {}  
 
+        # Generated pages persisted across sessions
+        self.page_cache = PageCache()
+
+        # Generations currently running, shared by identical requests
+        self.generation_registry = GenerationRegistry()
+
+        # Per-site prompt prefixes and the Ollama timings of each request
+        self.site_sessions = OrderedDict()
+        self.site_sessions_lock = threading.Lock()
+        self.generation_stats = OrderedDict()
+
+        # Bounded pool that runs generations, foreground tab first
+        self.generation_scheduler = GenerationScheduler()
+        self.tab_widget.currentChanged.connect(self.update_generation_priorities)
+        self.tab_widget.tabCloseRequested.connect(self.close_tab)
+
         # Initialize progress bar
         self.progress_dialog = None
 
@@ -386,7 +2908,7 @@ class GenerativeBrowser(QMainWindow):
             if self.tab_widget.tabText(index) == title:
                 widget = self.tab_widget.widget(index)
                 if isinstance(widget, QWebEngineView):
-                    widget.setHtml(content)
+                    load_document(widget, content)
                     break
 
     def create_title_bar(self):
@@ -573,10 +3095,13 @@ class GenerativeBrowser(QMainWindow):
         tab_index = self.tab_widget.addTab(chat_tab, "Main Chat")
         self.tab_widget.setCurrentIndex(tab_index)
 
-    def create_new_tab(self, title, is_loading=True, base_topic="", base_design=""):
-        """Creates a new tab with a QWebEngineView."""
+    def create_new_tab(self, title, is_loading=True, base_topic="", base_design="", use_cache=True, topic="",
+                       design_fingerprint=""):
+        """Creates a new tab with a QWebEngineView and schedules generation of topic (defaults to base_topic)."""
+        topic = topic or base_topic
         new_tab = QWebEngineView()
-        new_page = CustomWebEnginePage(browser=self, base_topic=base_topic, base_design=base_design)
+        new_page = CustomWebEnginePage(browser=self, base_topic=base_topic, base_design=base_design,
+                                       design_fingerprint=design_fingerprint)
         new_tab.setPage(new_page)
         if is_loading:
             # Display a dynamic loading message with rotating text and assistant button
@@ -632,7 +3157,7 @@ class GenerativeBrowser(QMainWindow):
                             background-color: #2980b9;
                         }
                     </style>
-                    <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
+                    <script src="genlib:qwebchannel.js"></script>
                     <script>
                         var bridge = null;
                         new QWebChannel(qt.webChannelTransport, function(channel) {
@@ -670,7 +3195,8 @@ class GenerativeBrowser(QMainWindow):
                 </body>
             </html>
             """
-            new_tab.setHtml(loading_html)
+            # The generated page replaces the loading screen in the history
+            new_page.document_url = load_document(new_tab, loading_html)
 
             # Set up WebChannel for communication
             channel = QWebChannel()
@@ -682,10 +3208,11 @@ class GenerativeBrowser(QMainWindow):
             bridge.request_edit.connect(lambda msg, tab=new_tab: self.handle_webpage_request(msg, tab))
 
             # Start generating content after the loading screen is set
-            QTimer.singleShot(0, lambda: self.generate_html_for_gen_site(base_topic, f"{base_topic}.gen", title, base_design))
+            QTimer.singleShot(0, lambda: self.generate_html_for_gen_site(topic, f"{topic}.gen", new_tab, design_fingerprint,
+                                                                         use_cache))
         else:
             # For non-loading tabs, set default content or handle differently
-            new_tab.setHtml("<html><body><h1>New Tab</h1></body></html>")
+            load_document(new_tab, "<html><body><h1>New Tab</h1></body></html>")
 
         tab_index = self.tab_widget.addTab(new_tab, title)
         self.tab_widget.setCurrentIndex(tab_index)
@@ -693,7 +3220,15 @@ class GenerativeBrowser(QMainWindow):
 
     def handle_webpage_request(self, message, tab):
         """Handle requests from the web page."""
-        if message == "Open Assistant":
+        if message.startswith("gen-img-visible:"):
+            # Lazy images that scrolled near the viewport, closest first
+            page = tab.page()
+            if isinstance(page, CustomWebEnginePage):
+                slot_ids = [int(slot_id) for slot_id in message.split(":", 1)[1].split(",") if slot_id.isdigit()]
+                image_slots = page.take_lazy_image_slots(slot_ids)
+                if image_slots:
+                    self.resolve_page_images(page, page.image_render, image_slots)
+        elif message == "Open Assistant":
             # Open the assistant chat for this tab
             tab_title = self.tab_widget.tabText(self.tab_widget.indexOf(tab))
             if tab_title.startswith("Building "):
@@ -709,8 +3244,13 @@ class GenerativeBrowser(QMainWindow):
             else:
                 QMessageBox.information(self, "Assistant Chat", "Assistant chat is only available for generated websites.")
 
-    def set_html_in_tab(self, title, html_content):
-        """Sets the HTML content in the specified tab."""
+    def set_html_in_tab(self, tab, html_content):
+        """Post-processes a generated page on a worker thread; show_processed_html puts it in the tab."""
+        index = self.tab_index(tab)
+        if index == -1 or not isinstance(tab, QWebEngineView):
+            # Closed while the page was being generated
+            return
+        title = self.tab_widget.tabText(index)
         # Fetch images based on the topic
         topic_match = re.match(r"Building\s+(.*)", title)
         if topic_match:
@@ -718,284 +3258,120 @@ class GenerativeBrowser(QMainWindow):
         else:
             topic = "default"
 
-        # Parse the HTML and replace image placeholders with actual URLs
-        soup = BeautifulSoup(html_content, 'html.parser')
-        img_tags = soup.find_all('img')
-
-        # List to keep track of threads
-        threads = []
-
-        def fetch_and_set_image(img_tag, retries=3):
-            # Simplify the query to improve image search results
-            if 'alt' in img_tag.attrs and img_tag['alt']:
-                query = img_tag['alt']
-                # Simplify query by removing special characters and taking first few words
-                query = re.sub(r'[^\w\s]', '', query)
-                query = ' '.join(query.split()[:5])
-            else:
-                query = topic
-            image_url = self.fetch_image_with_retries(query, retries)
-            print(f"Setting image for '{query}': {image_url}")
-            img_tag['src'] = image_url
-
-            # Add class for responsive images
-            if 'class' in img_tag.attrs:
-                img_tag['class'].append('responsive-img')
-            else:
-                img_tag['class'] = ['responsive-img']
-
-        def fetch_and_set_background_image(element, retries=3):
-            style = element.get('style', '')
-            if 'background-image' in style:
-                # Extract the URL inside background-image: url(...)
-                match = re.search(r'background-image\s*:\s*url\([\'"]?(.*?)[\'"]?\)', style)
-                if match:
-                    bg_url = match.group(1)
-                    # If the URL is a placeholder, fetch a new image
-                    if 'path/to/your/background.jpg' in bg_url or 'placeholder' in bg_url or 'your_image_here' in bg_url:
-                        # Use the alt attribute or topic as the query
-                        query = element.get('alt', topic)
-                        query = re.sub(r'[^\w\s]', '', query)
-                        query = ' '.join(query.split()[:5])
-                        image_url = self.fetch_image_with_retries(query, retries)
-                        print(f"Setting background image for '{query}': {image_url}")
-                        # Replace the URL in the style
-                        new_style = style.replace(bg_url, image_url)
-                        element['style'] = new_style
-
-        # Fetch images in threads to prevent blocking
-        for img in img_tags:
-            thread = threading.Thread(target=fetch_and_set_image, args=(img,))
-            threads.append(thread)
-            thread.start()
-
-        # Process inline styles with background-image
-        for element in soup.find_all(style=True):
-            thread = threading.Thread(target=fetch_and_set_background_image, args=(element,))
-            threads.append(thread)
-            thread.start()
-
-        # Wait for all threads to finish
-        for thread in threads:
-            thread.join()
-
-        # Inject CSS styles for responsive images and containers
-        style_tag = soup.new_tag('style')
-        style_tag.string = """
-        img.responsive-img {
-            max-width: 100%;
-            height: auto;
-            display: block;
-        }
-        .container, .content-container, .content-section {
-            width: 100%;
-            overflow: hidden;
-        }
-        """
-        # Include external CSS libraries
-        bootstrap_css = soup.new_tag('link', rel='stylesheet', href='https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css')
-        # Include external JS libraries
-        bootstrap_js = soup.new_tag('script', src='https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.min.js')
-
-        jquery_js = soup.new_tag('script', src='https://code.jquery.com/jquery-3.5.1.slim.min.js')
-
-        popper_js = soup.new_tag('script', src='https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js')
+        page = tab.page()
+        # Lazy images need the page's WebBridge to report what scrolls into view
+        lazy = LAZY_IMAGE_LOADING and isinstance(page, CustomWebEnginePage) and page.webChannel() is not None
+        self.post_process_executor.submit(self.post_process_page, tab, title, page, lazy, topic, html_content)
 
-        if soup.head:
-            soup.head.append(style_tag)
-            soup.head.append(bootstrap_css)
-        else:
-            # If there's no <head>, create one
-            head_tag = soup.new_tag('head')
-            head_tag.append(style_tag)
-            head_tag.append(bootstrap_css)
-            soup.insert(0, head_tag)
-
-        # Append scripts before closing body tag
-        if soup.body:
-            soup.body.append(jquery_js)
-            soup.body.append(popper_js)
-            soup.body.append(bootstrap_js)
-        else:
-            # If there's no <body>, create one
-            body_tag = soup.new_tag('body')
-            body_tag.append(jquery_js)
-            body_tag.append(popper_js)
-            body_tag.append(bootstrap_js)
-            soup.insert(len(soup.contents), body_tag)
-
-        final_html = str(soup)
-
-        # Set the modified HTML to the tab
-        for index in range(self.tab_widget.count()):
-            if self.tab_widget.tabText(index) == title:
-                widget = self.tab_widget.widget(index)
-                if isinstance(widget, QWebEngineView):
-                    widget.setHtml(final_html)
-                    # Store the base design if it's the main page
-                    if title.startswith("Building "):
-                        base_topic = topic
-                        self.site_designs[base_topic] = final_html
-                break
-
-    def fetch_image_with_retries(self, query, retries=3):
-        """Fetch a single image URL from Wikimedia Commons based on the query with retries."""
-        for attempt in range(retries):
-            image_url = self.fetch_image(query)
-            if image_url and not image_url.startswith("https://via.placeholder.com"):
-                return image_url
-            # Modify the query slightly for the next attempt
-            query += " photo"
-        # After retries, return the placeholder
-        return "https://via.placeholder.com/300x200.png?text=No+Image"
-
-    def fetch_image(self, query):
-        """Fetch a single image URL from Wikimedia Commons based on the query."""
-        url = WIKIMEDIA_API_URL
-        # First, search for images in the file namespace
-        search_params = {
-            "action": "query",
-            "format": "json",
-            "list": "search",
-            "srsearch": query,
-            "srnamespace": 6,  
-            "srlimit": 20  
-        }
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp')
+    def post_process_page(self, tab, title, page, lazy, topic, html_content):
+        """Worker side of set_html_in_tab: parse, rewrite and serialize, then hand the HTML to the GUI thread."""
+        start = time.perf_counter()
         try:
-            response = requests.get(url, params=search_params)
-            if response.status_code == 200:
-                data = response.json()
-                if "query" in data and "search" in data["query"]:
-                    search_results = data["query"]["search"]
-                    for result in search_results:
-                        title = result['title']
-                        # Now get imageinfo for this title
-                        imageinfo_params = {
-                            "action": "query",
-                            "format": "json",
-                            "titles": title,
-                            "prop": "imageinfo",
-                            "iiprop": "url|mime",
-                            "iiurlwidth": 800,
-                            "iiurlheight": 600
-                        }
-                        imageinfo_response = requests.get(url, params=imageinfo_params)
-                        if imageinfo_response.status_code == 200:
-                            imageinfo_data = imageinfo_response.json()
-                            if "query" in imageinfo_data and "pages" in imageinfo_data["query"]:
-                                page_data = next(iter(imageinfo_data["query"]["pages"].values()))
-                                if "imageinfo" in page_data:
-                                    imageinfo = page_data["imageinfo"][0]
-                                    mime_type = imageinfo.get("mime", "")
-                                    image_url = imageinfo.get("url", "")
-                                    if mime_type.startswith("image/") and image_url.lower().endswith(valid_extensions):
-                                        return image_url
-                    # If no image found, use a default placeholder
-                    print(f"No images found for query: {query}")
-                    return "https://via.placeholder.com/300x200.png?text=No+Image"
-                else:
-                    print(f"No search results for query: {query}")
-                    return "https://via.placeholder.com/300x200.png?text=No+Image"
-            else:
-                print(f"Failed to fetch image from Wikimedia Commons: {response.status_code}")
-                return "https://via.placeholder.com/300x200.png?text=No+Image"
+            # Render right away with pending placeholders; images are swapped in as they resolve
+            final_html, document, image_slots = post_process_html(html_content, topic, defer_images=True,
+                                                              observe_images=lazy, local_libraries=True)
         except Exception as e:
-            print(f"Exception while fetching image: {e}")
-            return "https://via.placeholder.com/300x200.png?text=No+Image"
-
-    def load_bookmarks(self):
-        """Load bookmarks from a JSON file."""
-        try:
-            with open("bookmarks.json", "r") as file:
-                self.bookmarks = json.load(file)
-        except FileNotFoundError:
-            self.bookmarks = {}
-        except json.JSONDecodeError:
-            self.bookmarks = {}
-
-    def save_bookmarks(self):
-        """Save bookmarks to a JSON file."""
-        try:
-            with open("bookmarks.json", "w") as file:
-                json.dump(self.bookmarks, file, indent=4)
-        except Exception as e:
-            print(f"Failed to save bookmarks: {e}")
-
-    def add_bookmark(self):
-        """Add the current page to bookmarks."""
-        current_index = self.tab_widget.currentIndex()
-        if current_index == -1:
-            QMessageBox.warning(self, "No Page", "There is no page to bookmark.")
+            print(f"Post-processing failed for {title}: {e}")
+            final_html, document, image_slots = html_content, None, []
+        final_html = minify_page(final_html, title)
+        design_fingerprint = ""
+        if title.startswith("Building ") and isinstance(page, CustomWebEnginePage) and not page.base_design:
+            # A site's main page: its fingerprint keys and prompts every subpage, so parse it here, not on the GUI thread
+            try:
+                design_fingerprint = extract_design_fingerprint(html_content)
+            except Exception as e:
+                print(f"Design fingerprint failed for {title}: {e}")
+        processed = ProcessedPage(page, lazy, final_html, document, image_slots, time.perf_counter() - start,
+                                  html_content, design_fingerprint)
+        self.signal_communicator.html_processed_signal.emit(tab, processed)
+
+    def show_processed_html(self, tab, processed):
+        """Sets a post-processed page in its tab, unless the tab was closed or given another page meanwhile."""
+        gui_start = time.perf_counter()
+        page = processed.page
+        index = self.tab_index(tab)
+        if index == -1 or tab.page() is not page:
             return
-        current_title = self.tab_widget.tabText(current_index)
-        current_tab = self.tab_widget.widget(current_index)
-        if isinstance(current_tab, QWebEngineView):
-            url = current_tab.url().toString()
+        title = self.tab_widget.tabText(index)
+        render = 0
+        if isinstance(page, CustomWebEnginePage):
+            render = page.start_image_render(processed.image_slots if processed.lazy else ())
+            page.document_url = load_document(tab, processed.html, page.document_url)
         else:
-            url = ""
-        if not url:
-            # For generated pages without a URL, we can use the title
-            url = current_title
-
-        # Use a dialog to get a name for the bookmark
-        bookmark_name, ok = QInputDialog.getText(self, "Add Bookmark", "Bookmark Name:", QLineEdit.Normal, current_title)
-        if ok and bookmark_name:
-            self.bookmarks[bookmark_name] = url
-            self.save_bookmarks()
-            QMessageBox.information(self, "Bookmark Added", f"Bookmark '{bookmark_name}' added.")
-
-    def generate_internal_page(self, base_topic, link_text, base_design):
-        """Generates a page for an internal link."""
-        page_type = link_text.strip('/')
-        new_topic = f"{base_topic} - {page_type}"
-        tab_title = f"Building {new_topic}.gen"
-        self.create_new_tab(tab_title, is_loading=True, base_topic=base_topic, base_design=base_design)
-        self.generate_html_for_gen_site(new_topic, f"{new_topic}.gen", tab_title, base_design)
-
-    def generate_new_tab_from_link(self, link_text):
-        """Generates a new tab for an external link."""
-        new_topic = link_text.strip('/')
-        tab_title = f"Building {new_topic}.gen"
-        self.create_new_tab(tab_title, is_loading=True, base_topic=new_topic)
-        self.generate_html_for_gen_site(new_topic, f"{new_topic}.gen", tab_title)
-
-    def pull_model(self, model_name):
-        """Pull the model if it's not available locally."""
-        self.show_progress_dialog(f"Pulling model '{model_name}'...")
+            load_document(tab, processed.html)
+        if processed.image_slots and not processed.lazy:
+            self.resolve_page_images(page, render, processed.image_slots)
+        # Store the base design if it's the main page
+        if title.startswith("Building "):
+            base_topic = title[len("Building "):].replace(".gen", "").strip()
+            # The design is the page as the model wrote it: subpages shouldn't copy the markup we inject
+            self.site_designs[base_topic] = processed.source_html
+            if isinstance(page, CustomWebEnginePage) and not page.base_design:
+                # Links on a site's main page carry its design to the subpages
+                page.base_design = processed.source_html
+                page.design_fingerprint = processed.design_fingerprint
+            if PREFETCH_ENABLED and processed.document is not None:
+                self.prefetch_internal_links(page, processed.document)
+        print(f"[render] {title}: post-processed in {processed.worker_seconds:.2f}s on a worker, "
+              f"{(time.perf_counter() - gui_start) * 1000:.0f}ms on the GUI thread")
+
+    def resolve_page_images(self, page, render, image_slots):
+        """Looks up the images of a rendered page in the background and patches each one in as it arrives."""
+        stats = ImageLookupStats()
+        lookup_start = time.time()
+        emit = self.signal_communicator.image_ready_signal.emit
+        used = page.images_used if isinstance(page, CustomWebEnginePage) else None
+        future = image_resolver.submit(image_slots, stats, on_resolved=lambda slot, url: emit(page, render, slot, url),
+                                       used=used)
+        future.add_done_callback(lambda _: log_image_stats(image_slots, stats, lookup_start))
+
+    def patch_image_in_page(self, page, render, slot, image_url):
+        """Swaps a resolved image into its page, unless the tab was closed or re-rendered meanwhile."""
+        if not isinstance(page, CustomWebEnginePage):
+            return
+        print(f"Setting {'background image' if slot.bg_url else 'image'} for '{slot.query}': {image_url}")
+        # The page loads thumbnails through the local blob store (see image_patch_script)
         try:
-            for progress in ollama_client.pull(model_name):
-                # Update progress bar
-                self.update_progress_dialog(progress.get('progress', 0))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to pull model '{model_name}': {str(e)}")
-            print(f"Failed to pull model '{model_name}': {e}")
-        finally:
-            self.hide_progress_dialog()
-
-    def show_progress_dialog(self, message):
-        """Display a progress dialog."""
-        self.progress_dialog = QDialog(self)
-        self.progress_dialog.setWindowTitle("Please Wait")
-        self.progress_dialog.setFixedSize(300, 100)
-        layout = QVBoxLayout()
-        label = QLabel(message)
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setMaximum(100)
-        layout.addWidget(label)
-        layout.addWidget(self.progress_bar)
-        self.progress_dialog.setLayout(layout)
-        self.progress_dialog.show()
-
-    def update_progress_dialog(self, progress):
-        """Update the progress bar."""
-        self.progress_bar.setValue(int(progress * 100))
-
-    def hide_progress_dialog(self):
-        """Hide the progress dialog."""
-        if self.progress_dialog:
-            self.progress_dialog.close()
-            self.progress_dialog = None
+            page.patch_image(render, slot, image_url)
+        except RuntimeError:
+            # The page was deleted with its tab
+            pass
+
+    def prefetch_internal_links(self, page, document):
+        """Pre-generates the likeliest subpages of a rendered site into the page cache at idle priority."""
+        if not isinstance(page, CustomWebEnginePage):
+            return
+        # Navigation links first, then the rest of the page in document order
+        topics = []
+        for href in document.links:
+            href = href.strip()
+            # In-page anchors scroll instead of navigating, so they never become subpages
+            if href.startswith(("#", "http", "www", "mailto:", "tel:", "javascript:")) or not href.strip('/'):
+                continue
+            # Resolve the href the way a click would, so "./about" and "about" prefetch the page the click opens
+            url = QUrl(DOCUMENT_URL_PREFIX).resolved(QUrl(href)).toString()
+            if not url.startswith(DOCUMENT_URL_PREFIX) or not url[len(DOCUMENT_URL_PREFIX):].strip('/#'):
+                continue
+            new_topic = self.internal_page_topic(page.base_topic, url)
+            if new_topic not in topics:
+                topics.append(new_topic)
+            if len(topics) >= PREFETCH_BUDGET:
+                break
+        for new_topic in topics:
+            print(f"Prefetching subpage: {new_topic}")
+            self.generate_html_for_gen_site(new_topic, f"{new_topic}.gen", None, page.design_fingerprint,
+                                            priority=GenerationScheduler.IDLE)
+
+    def set_partial_html_in_tab(self, tab, html_content):
+        """Shows a partially generated page in its tab while the model is still streaming."""
+        if self.tab_index(tab) == -1 or not isinstance(tab, QWebEngineView):
+            return
+        page = tab.page()
+        if isinstance(page, CustomWebEnginePage):
+            # Each streamed render replaces the last instead of adding to the history
+            page.document_url = load_document(tab, html_content, page.document_url)
+        else:
+            load_document(tab, html_content)
 
     def generate_content(self):
         """Generates content based on the user's query."""
@@ -1016,110 +3392,217 @@ class GenerativeBrowser(QMainWindow):
         self.chat_display.append(f"Gen Browser: Generating content for '{query}'")
         self.address_bar.clear()
 
-    def generate_html_for_gen_site(self, topic, query, tab_title, base_design=""):
-        """Generates HTML content for a .gen request."""
-        def generate():
+    def generate_html_for_gen_site(self, topic, query, tab, design_fingerprint="", use_cache=True, priority=None):
+        """
+        Generates HTML content for a .gen request, serving it from the page cache when possible.
+        tab is the QWebEngineView to show the page in; None only fills the page cache.
+        design_fingerprint is the main page's fingerprint for a subpage ("" for a main page).
+        Runs on the GUI thread, so the page cache is read on a worker (see lookup_or_generate).
+        """
+        model = self.current_model
+        cache_key = PageCache.make_key(topic, model, design_fingerprint)
+
+        # Attach to an identical in-flight generation (or cache lookup) instead of starting another
+        generation_key = GenerationRegistry.make_key(topic, design_fingerprint, model)
+        future, is_new = self.generation_registry.attach(generation_key, tab, force_new=not use_cache)
+
+        def deliver(f):
+            # Cancelled generations belong to closed or rerolled tabs
+            if tab is not None and not f.cancelled():
+                self.signal_communicator.html_ready_signal.emit(tab, f.result())
+
+        future.add_done_callback(deliver)
+        if not is_new:
+            print(f"Joined in-flight generation for {query} ({self.generation_registry.coalesced_count} coalesced so far)")
+            # A tab waiting on a prefetch lifts it out of idle priority
+            self.update_generation_priorities(self.tab_widget.currentIndex())
+            return
+
+        def generate(job):
             try:
                 print("Starting content generation...")
                 print(f"Sending request to model with topic: {topic}")
 
-                # Updated AI prompt
-                ai_prompt = f"""
-                Using HTML, CSS, and JavaScript, create a unique, modern, and professional website about {topic}.
-                Incorporate modern web design practices using frameworks like Bootstrap or Materialize.
-                Be imaginative, incorporating design elements, interactive features, animations, and layouts.
-                Ensure that all code is valid and tested, and avoid any JavaScript errors.
-                Important: Do not use any placeholder text like "Lorem ipsum". Instead, write meaningful content related to {topic}.
-                Include relevant images in the website by adding <img> tags with descriptive alt attributes, and include images using inline CSS styles like 'background-image', but use placeholder URLs like 'your_image_here.jpg'.
-                Do not include any actual image URLs in the code.
-                Do not include any external links except for CDN links to Bootstrap or other frameworks.
-                """
-
-                # If base_design is provided, instruct the AI to keep the same design
-                if base_design:
-                    ai_prompt += f"\n\nMaintain the same overall design and layout as the following HTML:\n\n{base_design}"
+                # Pages of the same site share one session so their prompts share a prefix
+                session = self.site_session(model, design_fingerprint, topic)
+                messages = session.messages_for(topic)
 
                 try:
-                    response = ollama_client.chat(
-                        model=self.current_model,
-                        messages=[
-                            {"role": "system", "content": "You are an assistant that generates unique, creative, and high-quality HTML, CSS, and JavaScript content without any markdown or code blocks."},
-                            {"role": "user", "content": ai_prompt}
-                        ]
-                    )
-                    print("Received response from Ollama client.")
+                    html, stats = self.request_site_html(model, session, messages, generation_key, job)
                 except Exception as e:
                     print(f"Exception during Ollama chat: {e}")
                     if "model not found" in str(e).lower():
                         # Model not found, try pulling it
-                        print(f"Model '{self.current_model}' not found. Attempting to pull the model.")
-                        self.pull_model(self.current_model)
+                        print(f"Model '{model}' not found. Attempting to pull the model.")
+                        self.pull_model(model)
                         # Retry after pulling
-                        response = ollama_client.chat(
-                            model=self.current_model,
-                            messages=[
-                                {"role": "system", "content": "You are an assistant that generates unique, creative, and high-quality HTML, CSS, and JavaScript content without any markdown or code blocks."},
-                                {"role": "user", "content": ai_prompt}
-                            ]
-                        )
+                        html, stats = self.request_site_html(model, session, messages, generation_key, job)
                         print("Received response from Ollama client after pulling the model.")
                     else:
                         raise e
 
-                print("Received response from model:", response)
+                if job.cancelled:
+                    print(f"Generation for {query} was cancelled.")
+                    return
 
-                if response and 'message' in response and 'content' in response['message']:
-                    content_stream = response['message']['content']
-                    print("Content stream received from model.")
+                self.record_generation_stats(query, stats)
+                session.record(topic, stats)
 
-                    # Extract HTML from the content stream
-                    generated_html = self.extract_html(content_stream)
+                if html:
                     print("Extracted HTML content.")
-
-                    # Emit the signal to set the HTML in the tab
-                    self.signal_communicator.html_ready_signal.emit(tab_title, generated_html)
+                    result_html = minify_page(html, query)
+                    self.page_cache.put(cache_key, result_html)
                 else:
                     print("No valid content received from model.")
-                    error_html = f"""
+                    result_html = f"""
                     <html>
                         <head><title>Error</title></head>
                         <body><h1>Error generating content</h1><p>No content was generated by the model.</p></body>
                     </html>
                     """
-                    self.signal_communicator.html_ready_signal.emit(tab_title, error_html)
 
             except Exception as e:
-                error_html = f"""
+                if job.cancelled:
+                    # Cancelling closes the connection, so the request fails with a transport error
+                    print(f"Generation for {query} was cancelled.")
+                    return
+                result_html = f"""
                 <html>
                     <head><title>Error</title></head>
                     <body><h1>Error generating content</h1><p>{str(e)}</p></body>
                 </html>
                 """
-                self.signal_communicator.html_ready_signal.emit(tab_title, error_html)
                 print(f"Error generating content for {query}: {e}")
 
-        # Start the HTML generation in a new thread to keep UI responsive
-        threading.Thread(target=generate, daemon=True).start()
+            # Hand the page to every tab waiting on this generation
+            self.generation_registry.finish(generation_key, future, result_html)
 
-    def extract_html(self, content):
+        if priority is None:
+            if self.tab_widget.currentWidget() is tab:
+                priority = GenerationScheduler.FOREGROUND
+            else:
+                priority = GenerationScheduler.BACKGROUND
+
+        def lookup_or_generate():
+            # A cache hit is answered at once instead of waiting for a generation slot
+            if future.cancelled():
+                return
+            if use_cache:
+                cached_html = self.page_cache.get(cache_key)
+                if cached_html:
+                    print(f"Serving cached page for {query}")
+                    self.generation_registry.finish(generation_key, future, cached_html)
+                    return
+            # Queue the generation on the scheduler to keep the UI responsive
+            job = self.generation_scheduler.submit(generate, priority)
+            self.generation_registry.set_job(generation_key, future, job)
+
+        self.post_process_executor.submit(lookup_or_generate)
+
+    def site_session(self, model, design_fingerprint, topic):
         """
-        Extracts HTML content from the model's response.
-        It first looks for HTML within ```html ... ``` code blocks.
-        If not found, it searches for <html> tags.
+        Return the generation session shared by all pages built on the design with this fingerprint.
+        A site's main page has no design yet, so it gets a session of its own topic.
         """
-        # Attempt to extract HTML within ```html ... ``` code blocks
-        code_block_match = re.search(r'```html\s*([\s\S]*?)\s*```', content, re.IGNORECASE)
-        if code_block_match:
-            return code_block_match.group(1)
-
-        # Fallback: Extract content between <html> tags
-        html_match = re.search(r'<html[\s\S]*?</html>', content, re.IGNORECASE)
-        if html_match:
-            return html_match.group(0)
+        if design_fingerprint:
+            key = (model, "design", hashlib.sha256(design_fingerprint.encode("utf-8")).hexdigest())
+        else:
+            key = (model, "topic", topic)
+        with self.site_sessions_lock:
+            if key not in self.site_sessions:
+                self.site_sessions[key] = SiteSession(model, design_fingerprint)
+                if len(self.site_sessions) > SITE_SESSION_LIMIT:
+                    self.site_sessions.popitem(last=False)
+            self.site_sessions.move_to_end(key)
+            return self.site_sessions[key]
+
+    def record_generation_stats(self, query, stats):
+        """Keep the timings of the latest GENERATION_STATS_LIMIT pages."""
+        with self.site_sessions_lock:
+            self.generation_stats.pop(query, None)
+            self.generation_stats[query] = stats
+            if len(self.generation_stats) > GENERATION_STATS_LIMIT:
+                self.generation_stats.popitem(last=False)
+
+    def update_generation_priorities(self, index):
+        """Gives queued generations for the newly selected tab priority over background tabs."""
+        current_tab = self.tab_widget.widget(index)
+        for job, tabs in self.generation_registry.jobs():
+            if not tabs:
+                # Prefetches stay at idle priority until a tab needs them
+                continue
+            if current_tab in tabs:
+                self.generation_scheduler.set_priority(job, GenerationScheduler.FOREGROUND)
+            else:
+                self.generation_scheduler.set_priority(job, GenerationScheduler.BACKGROUND)
+
+    def close_tab(self, index):
+        """Closes a tab, aborts any generation only that tab was waiting on and frees its view."""
+        tab = self.tab_widget.widget(index)
+        self.generation_registry.detach(tab)
+        self.tab_widget.removeTab(index)
+        page = tab.page() if isinstance(tab, QWebEngineView) else None
+        if isinstance(page, CustomWebEnginePage):
+            page.close_document()
+            # The page has no Qt parent, so it does not go with its view
+            page.deleteLater()
+        tab.deleteLater()
+
+    def tab_index(self, tab):
+        """Index of tab in the tab widget, or -1 once it has been closed (and maybe deleted)."""
+        try:
+            return self.tab_widget.indexOf(tab)
+        except RuntimeError:
+            return -1
 
-        # If no HTML is found, return entire content
-        print("HTML tags not found in content. Using entire content.")
-        return content  
+    def request_site_html(self, model, session, messages, generation_key, job):
+        """
+        Sends the chat request to the model and returns the page HTML extracted
+        from its response together with the timings Ollama reported (see response_stats).
+        The request runs on the Ollama pool, preferring the host that served the
+        site session before since its prompt cache already holds the prefix.
+        The model is kept loaded for SITE_SESSION_KEEP_ALIVE between requests.
+        With STREAM_GENERATION enabled, the partial page is pushed to every tab
+        waiting on the generation at most once every STREAM_RENDER_INTERVAL
+        seconds while tokens arrive. Either way, cancelling the job closes the
+        connection at once so Ollama stops generating; the request then raises.
+        """
+        if not STREAM_GENERATION:
+            response = get_ollama_pool().chat(model, messages, affinity=session, job=job, keep_alive=SITE_SESSION_KEEP_ALIVE)
+            print("Received response from Ollama client.")
+            stats = response_stats(response)
+            print(f"Prompt eval: {stats['prompt_eval_count']} tokens in {format_duration(stats['prompt_eval_duration'])}")
+            if response and 'message' in response and 'content' in response['message']:
+                return extract_html(response['message']['content']), stats
+            return "", stats
+
+        extractor = StreamingHtmlExtractor()
+        stats = {}
+        rendered_length = 0
+        last_render = 0.0
+        stream = get_ollama_pool().chat(model, messages, stream=True, affinity=session, job=job, keep_alive=SITE_SESSION_KEEP_ALIVE)
+        try:
+            for chunk in stream:
+                if job.cancelled:
+                    return "", stats
+                if chunk.get('done'):
+                    stats = response_stats(chunk)
+                    print(f"Prompt eval: {stats['prompt_eval_count']} tokens in {format_duration(stats['prompt_eval_duration'])}")
+                # After the page is complete the stream is only read for its final stats
+                extractor.feed(chunk.get('message', {}).get('content', ''))
+                now = time.monotonic()
+                if now - last_render < STREAM_RENDER_INTERVAL or extractor.length == rendered_length:
+                    continue
+                partial_html = extractor.html
+                for tab in self.generation_registry.tabs_for(generation_key):
+                    self.signal_communicator.html_partial_signal.emit(tab, partial_html)
+                rendered_length = extractor.length
+                last_render = now
+        finally:
+            # Closing the generator closes the HTTP response, which aborts the request on the server
+            stream.close()
+        print("Received streamed response from Ollama client.")
+        return extractor.result(), stats
 
     def toggle_dark_light_mode(self):
         """Toggles between dark and light mode with corresponding icons."""
@@ -1251,8 +3734,10 @@ class GenerativeBrowser(QMainWindow):
                 self.chat_display.append("Gen Browser: Invalid topic for reroll.")
                 return
             # Create a new tab with loading screen
-            self.create_new_tab(current_title, is_loading=True, base_topic=topic)
-            self.generate_html_for_gen_site(topic, query, current_title)
+            # Abort the current generation and replace the tab with a fresh one,
+            # bypassing the page cache so the model comes up with a new page
+            self.close_tab(current_index)
+            self.create_new_tab(current_title, is_loading=True, base_topic=topic, use_cache=False)
         else:
             self.chat_display.append("Gen Browser: Current tab is not a generated website.")
 
@@ -1288,11 +3773,11 @@ class GenerativeBrowser(QMainWindow):
         for index in range(self.tab_widget.count()):
             if self.tab_widget.tabText(index) == "Home":
                 self.tab_widget.setCurrentIndex(index)
-                self.tab_widget.widget(index).setHtml(home_html)
+                load_document(self.tab_widget.widget(index), home_html)
                 return
         # If Home tab doesn't exist, create it
         home_tab = QWebEngineView()
-        home_tab.setHtml(home_html)
+        load_document(home_tab, home_html)
         self.tab_widget.addTab(home_tab, "Home")
         self.tab_widget.setCurrentWidget(home_tab)
 
@@ -1303,66 +3788,23 @@ class GenerativeBrowser(QMainWindow):
         else:
             self.showFullScreen()
 
+    def navigate_to_url(self, url):
+        """Opens a bookmarked URL, regenerating .gen pages only on a page cache miss."""
+        query = url.replace("Building ", "", 1).strip()
+        if query.endswith(".gen"):
+            topic = query.replace(".gen", "").strip()
+            self.create_new_tab(f"Building {query}", is_loading=True, base_topic=topic)
+        else:
+            new_tab = QWebEngineView()
+            new_tab.setUrl(QUrl(url))
+            tab_index = self.tab_widget.addTab(new_tab, url)
+            self.tab_widget.setCurrentIndex(tab_index)
+
     def generate_html_from_query(self, query):
         """Handles non-.gen queries (Placeholder)."""
         # Placeholder for handling non-.gen queries
         self.chat_display.append(f"Gen Browser: Handling non-.gen query '{query}' is not yet implemented.")
 
-    def fetch_image(self, query):
-        """Fetch a single image URL from Wikimedia Commons based on the query."""
-        url = WIKIMEDIA_API_URL
-        # First, search for images in the file namespace
-        search_params = {
-            "action": "query",
-            "format": "json",
-            "list": "search",
-            "srsearch": query,
-            "srnamespace": 6,  
-            "srlimit": 20  
-        }
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp')
-        try:
-            response = requests.get(url, params=search_params)
-            if response.status_code == 200:
-                data = response.json()
-                if "query" in data and "search" in data["query"]:
-                    search_results = data["query"]["search"]
-                    for result in search_results:
-                        title = result['title']
-                        # Now get imageinfo for this title
-                        imageinfo_params = {
-                            "action": "query",
-                            "format": "json",
-                            "titles": title,
-                            "prop": "imageinfo",
-                            "iiprop": "url|mime",
-                            "iiurlwidth": 800,
-                            "iiurlheight": 600
-                        }
-                        imageinfo_response = requests.get(url, params=imageinfo_params)
-                        if imageinfo_response.status_code == 200:
-                            imageinfo_data = imageinfo_response.json()
-                            if "query" in imageinfo_data and "pages" in imageinfo_data["query"]:
-                                page_data = next(iter(imageinfo_data["query"]["pages"].values()))
-                                if "imageinfo" in page_data:
-                                    imageinfo = page_data["imageinfo"][0]
-                                    mime_type = imageinfo.get("mime", "")
-                                    image_url = imageinfo.get("url", "")
-                                    if mime_type.startswith("image/") and image_url.lower().endswith(valid_extensions):
-                                        return image_url
-                    # If no image found, use a default placeholder
-                    print(f"No images found for query: {query}")
-                    return "https://via.placeholder.com/300x200.png?text=No+Image"
-                else:
-                    print(f"No search results for query: {query}")
-                    return "https://via.placeholder.com/300x200.png?text=No+Image"
-            else:
-                print(f"Failed to fetch image from Wikimedia Commons: {response.status_code}")
-                return "https://via.placeholder.com/300x200.png?text=No+Image"
-        except Exception as e:
-            print(f"Exception while fetching image: {e}")
-            return "https://via.placeholder.com/300x200.png?text=No+Image"
-
     def load_bookmarks(self):
         """Load bookmarks from a JSON file."""
         try:
@@ -1389,7 +3831,10 @@ class GenerativeBrowser(QMainWindow):
             return
         current_title = self.tab_widget.tabText(current_index)
         current_tab = self.tab_widget.widget(current_index)
-        if isinstance(current_tab, QWebEngineView):
+        if current_title.startswith("Building "):
+            # Generated pages are bookmarked by their .gen query so they can be served from the page cache
+            url = current_title
+        elif isinstance(current_tab, QWebEngineView):
             url = current_tab.url().toString()
         else:
             url = ""
@@ -1404,26 +3849,30 @@ class GenerativeBrowser(QMainWindow):
             self.save_bookmarks()
             QMessageBox.information(self, "Bookmark Added", f"Bookmark '{bookmark_name}' added.")
 
-    def generate_internal_page(self, base_topic, link_text, base_design):
+    def internal_page_topic(self, base_topic, link_text):
+        """Builds the subpage topic for an internal link of a site."""
+        # Links arrive resolved against the page's gen://docs/ URL
+        page_type = re.sub(r'^(?:about:blank|' + re.escape(DOCUMENT_URL_PREFIX) + ')', '', link_text).strip('/#')
+        return f"{base_topic} - {page_type}"
+
+    def generate_internal_page(self, base_topic, link_text, base_design, design_fingerprint=""):
         """Generates a page for an internal link."""
-        page_type = link_text.strip('/')
-        new_topic = f"{base_topic} - {page_type}"
+        new_topic = self.internal_page_topic(base_topic, link_text)
         tab_title = f"Building {new_topic}.gen"
-        self.create_new_tab(tab_title, is_loading=True, base_topic=base_topic, base_design=base_design)
-        self.generate_html_for_gen_site(new_topic, f"{new_topic}.gen", tab_title, base_design)
+        self.create_new_tab(tab_title, is_loading=True, base_topic=base_topic, base_design=base_design, topic=new_topic,
+                            design_fingerprint=design_fingerprint)
 
     def generate_new_tab_from_link(self, link_text):
         """Generates a new tab for an external link."""
         new_topic = link_text.strip('/')
         tab_title = f"Building {new_topic}.gen"
         self.create_new_tab(tab_title, is_loading=True, base_topic=new_topic)
-        self.generate_html_for_gen_site(new_topic, f"{new_topic}.gen", tab_title)
 
     def pull_model(self, model_name):
         """Pull the model if it's not available locally."""
         self.show_progress_dialog(f"Pulling model '{model_name}'...")
         try:
-            for progress in ollama_client.pull(model_name):
+            for progress in get_ollama_pool().pull(model_name, stream=True):
                 # Update progress bar
                 self.update_progress_dialog(progress.get('progress', 0))
         except Exception as e:
@@ -1457,48 +3906,93 @@ class GenerativeBrowser(QMainWindow):
             self.progress_dialog = None
 
 
-class SignalCommunicator(QObject):
-    """A helper class to define custom signals."""
-    html_ready_signal = pyqtSignal(str, str)  
-
-
-class ClosableTabBar(QTabBar):
-    """Custom QTabBar that adds a close button to each tab."""
-    def tabSizeHint(self, index):
-        size = super().tabSizeHint(index)
-        size.setWidth(size.width() + 25)  
-        return size
-
-    def paintEvent(self, event):
-        """Custom paint event to draw close buttons."""
-        painter = QStylePainter(self)
-        option = QStyleOptionTab()
-
-        for index in range(self.count()):
-            self.initStyleOption(option, index)
-            painter.drawControl(QStyle.CE_TabBarTab, option)
+def generate_page(topic, model=DEFAULT_MODEL, design_fingerprint="", page_cache=None, refresh=False):
+    """
+    Generates the HTML for a topic without any Qt widgets, using the same prompt,
+    extraction and page cache keys as the browser. Returns (html, was_cached).
+    """
+    cache_key = PageCache.make_key(topic, model, design_fingerprint)
+    if page_cache is not None and not refresh:
+        cached_html = page_cache.get(cache_key)
+        if cached_html:
+            return cached_html, True
+
+    session = SiteSession(model, design_fingerprint)
+    response = get_ollama_pool().chat(model, session.messages_for(topic), keep_alive=SITE_SESSION_KEEP_ALIVE)
+    content = response.get('message', {}).get('content', '')
+    if not content:
+        raise ValueError("No content was generated by the model.")
+    html = minify_page(extract_html(content), topic)
+    if page_cache is not None:
+        page_cache.put(cache_key, html)
+    return html, False
+
+
+def run_batch(argv):
+    """
+    Headless entry point: python GenBrowser.py --batch topics.txt [--out dir/]
+    Generates every topic in the file (one per line, '.gen' optional) into the
+    page cache so interactive users get instant hits. With --out the finished
+    pages, images included, are also written to that directory.
+    """
+    parser = argparse.ArgumentParser(prog="GenBrowser.py", description="Pre-generate .gen pages without opening the browser.")
+    parser.add_argument("--batch", required=True, metavar="TOPICS_FILE", help="file with one topic per line")
+    parser.add_argument("--out", metavar="DIR", help="also write the post-processed pages to this directory")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"model to generate with (default: {DEFAULT_MODEL})")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_GENERATIONS, help="topics generated at once")
+    parser.add_argument("--refresh", action="store_true", help="regenerate topics that are already cached")
+    args = parser.parse_args(argv)
+
+    with open(args.batch, "r", encoding="utf-8") as file:
+        lines = [line.strip() for line in file]
+    # Same topic normalization as the address bar, so the cache keys match
+    topics = list(dict.fromkeys(line.replace(".gen", "").strip() for line in lines if line and not line.startswith("#")))
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    page_cache = PageCache()
+
+    def run(topic):
+        started = time.monotonic()
+        html, cached = generate_page(topic, args.model, page_cache=page_cache, refresh=args.refresh)
+        if args.out:
+            final_html, _, _ = post_process_html(html, topic)
+            final_html = minify_page(final_html, topic)
+            file_name = re.sub(r'[^\w-]+', '-', topic.lower()).strip('-') or "page"
+            with open(os.path.join(args.out, f"{file_name}.html"), "w", encoding="utf-8") as file:
+                file.write(final_html)
+        return cached, time.monotonic() - started
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {executor.submit(run, topic): topic for topic in topics}
+        for future in as_completed(futures):
+            topic = futures[future]
+            try:
+                cached, elapsed = future.result()
+                print(f"[batch] {topic}: {'cached' if cached else 'generated'} in {elapsed:.1f}s")
+            except Exception as e:
+                failures += 1
+                print(f"[batch] {topic}: failed: {e}")
+    print(f"[batch] {len(topics) - failures}/{len(topics)} topics done")
+    return 1 if failures else 0
 
-            # Draw the close button closer to the text
-            rect = self.tabRect(index)
-            icon = self.style().standardIcon(QStyle.SP_TitleBarCloseButton)
-            # Adjust the close button position vertically centered
-            close_rect = QRect(rect.right() - 20, rect.top() + (rect.height() - 16) // 2, 16, 16)
-            icon.paint(painter, close_rect)
 
-    def mousePressEvent(self, event):
-        """Handles mouse press events to detect close button clicks."""
-        # Check if the close button is clicked
-        for index in range(self.count()):
-            rect = self.tabRect(index)
-            close_rect = QRect(rect.right() - 20, rect.top() + (rect.height() - 16) // 2, 16, 16)
-            if close_rect.contains(event.pos()):
-                self.parent().removeTab(index)  
-                return
-        super().mousePressEvent(event)
+# Main application function
+def batch_requested(argv):
+    """Whether the command line asks for headless pre-generation, as --batch FILE or --batch=FILE."""
+    # Everything else is left for run_batch or Qt to parse
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--batch", nargs="?", const="")
+    args, _ = parser.parse_known_args(argv)
+    return args.batch is not None
 
 
-# Main application function
 def main():
+    start_ollama_pool()
+    if batch_requested(sys.argv[1:]):
+        # Headless pre-generation needs no QApplication or display
+        sys.exit(run_batch(sys.argv[1:]))
+    register_url_schemes()
     app = QApplication(sys.argv)
     app.setApplicationName("Gen Browser Prototype")
     browser = GenerativeBrowser()
@@ -0,0 +1,201 @@
+"""
+End-to-end page benchmark.
+
+Starts a mock Ollama and a mock Wikimedia Commons API on localhost, points
+GenBrowser at them and builds a handful of sites through the real
+generate_html_for_gen_site -> set_html_in_tab path. Prints one JSON report.
+
+    python benchmarks/bench_pages.py --pages 3 --tokens-per-second 300 --wiki-latency 0.15
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.dirname(BENCH_DIR)]
+from mock_servers import start_mock_ollama, start_mock_wikimedia, server_url
+
+TOPICS = ["nuclear energy", "medieval castles", "deep sea creatures", "jazz history",
+          "mountain railways", "ancient rome", "coral reefs", "space telescopes"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "mean": round(statistics.mean(ordered), 3),
+        "p50": round(ordered[len(ordered) // 2], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class ThreadSampler(threading.Thread):
+    """Records the peak number of live threads while the benchmark runs."""
+
+    def __init__(self, interval=0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = threading.active_count()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+
+def run(options):
+    ollama_server = start_mock_ollama(tokens_per_second=options.tokens_per_second)
+    wiki_server = start_mock_wikimedia(latency=options.wiki_latency)
+    # GenBrowser reads its endpoints at import time
+    os.environ["OLLAMA_SERVERS"] = server_url(ollama_server)
+    os.environ["WIKIMEDIA_API_URL"] = f"{server_url(wiki_server)}/w/api.php"
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # Keep the page cache of the benchmark out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="genbrowser-bench-"))
+
+    import GenBrowser
+    from PyQt5.QtCore import QTimer
+    # Lazy images wait for the page to report them visible, which needs a shown, scrolling view
+    GenBrowser.LAZY_IMAGE_LOADING = options.lazy_images
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance()
+    if app is None:
+        GenBrowser.register_url_schemes()
+        app = QApplication(sys.argv[:1])
+    browser = GenBrowser.GenerativeBrowser()
+
+    # Pages render first and resolve their images afterwards, so time each resolver run
+    image_times = []
+    images_pending = []
+    resolver = GenBrowser.image_resolver
+    original_submit = resolver.submit
+
+    def timed_submit(*args, **kwargs):
+        start = time.perf_counter()
+        future = original_submit(*args, **kwargs)
+        images_pending.append(future)
+
+        def done(_):
+            image_times.append(time.perf_counter() - start)
+            images_pending.remove(future)
+
+        future.add_done_callback(done)
+        return future
+
+    resolver.submit = timed_submit
+
+    topics = [TOPICS[i % len(TOPICS)] + ("" if i < len(TOPICS) else f" {i}") for i in range(options.pages)]
+    # Keyed by tab; titles are only for the report
+    titles = {}
+    started = {}
+    first_paint = {}
+    finished = {}
+
+    def on_partial(tab, _html):
+        first_paint.setdefault(tab, time.perf_counter())
+
+    def on_ready(tab, _processed):
+        # Connected after show_processed_html, so this fires once the page is in the tab
+        now = time.perf_counter()
+        first_paint.setdefault(tab, now)
+        finished.setdefault(tab, now)
+
+    browser.signal_communicator.html_partial_signal.connect(on_partial)
+    browser.signal_communicator.html_processed_signal.connect(on_ready)
+
+    sampler = ThreadSampler()
+    sampler.start()
+    baseline_threads = threading.active_count()
+    deadline = time.perf_counter() + options.timeout
+
+    def open_next(index=0):
+        if index >= len(topics):
+            return
+        title = f"Building {topics[index]}.gen"
+        start = time.perf_counter()
+        tab = browser.create_new_tab(title, is_loading=True, base_topic=topics[index], use_cache=False)
+        titles[tab] = title
+        started[tab] = start
+        QTimer.singleShot(int(options.stagger * 1000), lambda: open_next(index + 1))
+
+    def check_done():
+        if (len(finished) == len(topics) and not images_pending) or time.perf_counter() > deadline:
+            app.quit()
+
+    poll = QTimer()
+    poll.timeout.connect(check_done)
+    poll.start(50)
+    QTimer.singleShot(0, open_next)
+    wall_start = time.perf_counter()
+    app.exec_()
+    wall = time.perf_counter() - wall_start
+    sampler.stopped.set()
+    resolver.submit = original_submit
+
+    pages = []
+    for tab, start in started.items():
+        pages.append({
+            "title": titles[tab],
+            "time_to_first_paint": round(first_paint[tab] - start, 3) if tab in first_paint else None,
+            "total_latency": round(finished[tab] - start, 3) if tab in finished else None,
+        })
+    return {
+        "config": {
+            "pages": options.pages,
+            "stagger": options.stagger,
+            "tokens_per_second": options.tokens_per_second,
+            "wiki_latency": options.wiki_latency,
+            "lazy_images": options.lazy_images,
+        },
+        "completed": len(finished),
+        "timed_out": len(finished) < len(topics),
+        "wall_time": round(wall, 3),
+        "time_to_first_paint": summarize([p["time_to_first_paint"] for p in pages if p["time_to_first_paint"] is not None]),
+        "total_latency": summarize([p["total_latency"] for p in pages if p["total_latency"] is not None]),
+        "image_resolution_time": summarize(image_times),
+        "threads": {"baseline": baseline_threads, "peak": sampler.peak},
+        "peak_rss_mb": peak_rss_mb(),
+        "gui_stall": browser.stall_monitor.snapshot(),
+        "requests": {"ollama_chat": ollama_server.requests, "wikimedia_api": wiki_server.requests},
+        "image_bytes_served": wiki_server.image_bytes,
+        "pages_detail": pages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GenBrowser against local mock servers.")
+    parser.add_argument("--pages", type=int, default=3, help="sites to build")
+    parser.add_argument("--stagger", type=float, default=0.0, help="seconds between opening tabs")
+    parser.add_argument("--tokens-per-second", type=float, default=300.0, help="mock model streaming rate")
+    parser.add_argument("--wiki-latency", type=float, default=0.15, help="mock Wikimedia API latency in seconds")
+    parser.add_argument("--lazy-images", action="store_true",
+                        help="resolve images only as the page reports them visible (needs a real, shown view)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="give up after this many seconds")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    options = parser.parse_args()
+
+    output = os.path.abspath(options.output) if options.output else None
+    report = run(options)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+HTML rewriter micro-benchmark.
+
+Runs post_process_html over large generated pages with each rewriter backend
+(lxml and bs4's html.parser) and prints one JSON report of the timings. Images
+are deferred, so no lookups happen and only parsing, rewriting and
+serialization are measured. The minifier is timed on the rewritten page.
+
+    python benchmarks/bench_rewriter.py --sizes 50 100 200 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCH_DIR, os.path.dirname(BENCH_DIR)]
+from mock_servers import build_canned_page
+
+
+def page_of_size(extract_html, kilobytes):
+    """A canned page grown to at least the given size, with one image every three sections."""
+    sections = 12
+    while True:
+        html = extract_html(build_canned_page(image_count=sections // 3, section_count=sections))
+        if len(html) >= kilobytes * 1024:
+            return html
+        sections += 12
+
+
+def time_rewriter(post_process_html, html, rewriter, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        post_process_html(html, "energy", defer_images=True, observe_images=True, local_libraries=True, rewriter=rewriter)
+        timings.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(timings)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def run(options):
+    # Keep any cache files GenBrowser creates out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="genbrowser-bench-"))
+    import GenBrowser
+
+    rewriters = ["soup"] + (["lxml"] if GenBrowser.lxml is not None else [])
+    results = []
+    for kilobytes in options.sizes:
+        html = page_of_size(GenBrowser.extract_html, kilobytes)
+        result = {"page_kb": round(len(html) / 1024, 1)}
+        for rewriter in rewriters:
+            # One untimed run warms up imports and regex caches
+            GenBrowser.post_process_html(html, "energy", defer_images=True, rewriter=rewriter)
+            result[rewriter] = time_rewriter(GenBrowser.post_process_html, html, rewriter, options.repeat)
+        if "lxml" in result:
+            result["speedup"] = round(result["soup"]["mean_ms"] / result["lxml"]["mean_ms"], 2)
+        final_html = GenBrowser.post_process_html(html, "energy", defer_images=True, local_libraries=True)[0]
+        start = time.perf_counter()
+        minified = GenBrowser.minify_html(final_html)
+        result["minify"] = {
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+            "before_kb": round(len(final_html.encode("utf-8")) / 1024, 1),
+            "after_kb": round(len(minified.encode("utf-8")) / 1024, 1),
+        }
+        results.append(result)
+    return {"repeat": options.repeat, "rewriters": rewriters, "pages": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML rewriter backends on large pages.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200], help="page sizes in KB")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per page and rewriter")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    options = parser.parse_args()
+
+    output = os.path.abspath(options.output) if options.output else None
+    report = run(options)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
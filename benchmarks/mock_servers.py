@@ -0,0 +1,260 @@
+"""Local stand-ins for Ollama and the Wikimedia Commons API used by the benchmarks."""
+import json
+import re
+import select
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# 1x1 transparent PNG served for every image URL
+PIXEL_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000005000166e8c2e60000000049454e44ae426082"
+)
+
+IMAGE_SUBJECTS = [
+    "nuclear reactor core", "cooling tower at dusk", "control room panel", "uranium fuel pellets",
+    "wind turbines on a hill", "solar panel field", "power grid substation", "scientists in a lab",
+    "electric car charging", "hydroelectric dam", "city skyline at night", "engineer with a helmet",
+    "steam turbine hall", "radiation warning sign", "geothermal plant", "old coal power station",
+    "battery storage units", "fusion research tokamak", "transmission towers", "children visiting a museum",
+]
+
+
+def build_canned_page(image_count=15, background_count=3, section_count=12):
+    """A model response shaped like real output: chatter, a fenced page with images, more chatter."""
+    sections = []
+    for index in range(section_count):
+        sections.append(f"""
+        <section class="content-section py-5" id="section-{index}">
+            <div class="container">
+                <h2 class="section-title">Chapter {index + 1}: how modern energy systems work</h2>
+                <p class="lead">Energy generation has changed dramatically over the last century, moving from
+                small local plants to continent-spanning grids that balance supply and demand every second.</p>
+                <div class="row">
+                    <div class="col-md-6"><p>Operators forecast demand, schedule plants, and keep reserves ready
+                    for sudden changes. Each decision trades off cost, emissions, and reliability.</p></div>
+                    <div class="col-md-6"><p>New storage technologies let grids absorb variable output from wind
+                    and solar farms, shifting energy from sunny afternoons to busy evenings.</p></div>
+                </div>
+            </div>
+        </section>""")
+    for index in range(image_count):
+        subject = IMAGE_SUBJECTS[index % len(IMAGE_SUBJECTS)]
+        sections.insert(index % len(sections), f"""
+        <div class="card mb-4"><img class="card-img-top" src="your_image_here.jpg" alt="{subject}">
+            <div class="card-body"><p class="card-text">A photo of a {subject}.</p></div></div>""")
+    for index in range(background_count):
+        sections.insert(0, f"""
+        <div class="hero" style="background-image: url('your_image_here.jpg'); height: 400px;">
+            <h1 class="display-4">Energy for everyone {index}</h1></div>""")
+    body = "\n".join(sections)
+    return f"""Here is a modern website about the topic you asked for:
+
+```html
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Energy Explained</title>
+    <link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css">
+    <style>
+        /* Site theme */
+        body {{ background-color: #0f172a; color: #e2e8f0; font-family: 'Segoe UI', sans-serif; }}
+        .hero {{ background-size: cover; display: flex; align-items: center; justify-content: center; }}
+        .section-title {{ color: #38bdf8; margin-bottom: 1rem; }}
+        .card {{ background: #1e293b; border: none; }}
+    </style>
+</head>
+<body>
+    <nav class="navbar navbar-expand-lg navbar-dark bg-dark">
+        <a class="navbar-brand" href="#">Energy Explained</a>
+        <ul class="navbar-nav">
+            <li class="nav-item"><a class="nav-link" href="about.html">About</a></li>
+            <li class="nav-item"><a class="nav-link" href="history.html">History</a></li>
+            <li class="nav-item"><a class="nav-link" href="future.html">Future</a></li>
+        </ul>
+    </nav>
+{body}
+    <footer class="footer bg-dark text-center py-3"><p>&copy; 2024 Energy Explained</p></footer>
+    <script src="https://code.jquery.com/jquery-3.5.1.slim.min.js"></script>
+</body>
+</html>
+```
+
+Let me know if you would like any changes!"""
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    """Streams the canned page as NDJSON chat chunks at server.tokens_per_second."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            self.send_json({"models": [{"name": f"{name}:latest"} for name in self.server.models]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/chat":
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self.server.requests += 1
+        text = self.server.response_text
+        # Roughly four characters per token, like the real tokenizers
+        tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+        prompt_chars = sum(len(message.get("content", "")) for message in request.get("messages", []))
+        final = {
+            "model": request.get("model"), "done": True,
+            "prompt_eval_count": prompt_chars // 4, "prompt_eval_duration": prompt_chars * 50_000,
+            "eval_count": len(tokens), "eval_duration": int(len(tokens) / self.server.tokens_per_second * 1e9),
+        }
+        if not request.get("stream", True):
+            if self.client_disconnected(len(tokens) / self.server.tokens_per_second):
+                # The client cancelled the generation
+                with self.server.lock:
+                    self.server.cancelled += 1
+                return
+            self.send_json({**final, "message": {"role": "assistant", "content": text}})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(1 / self.server.tokens_per_second)
+                self.write_chunk({"model": request.get("model"), "done": False,
+                                  "message": {"role": "assistant", "content": token}})
+            self.write_chunk({**final, "message": {"role": "assistant", "content": ""}})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the generation
+            with self.server.lock:
+                self.server.cancelled += 1
+
+    def client_disconnected(self, seconds):
+        """Spends seconds generating, returning True as soon as the client hangs up."""
+        deadline = time.monotonic() + seconds
+        readable, _, _ = select.select([self.connection], [], [], seconds)
+        if readable:
+            try:
+                if not self.connection.recv(1, socket.MSG_PEEK):
+                    return True
+            except ConnectionResetError:
+                return True
+            # Data from the client rather than a hang-up; keep generating
+            time.sleep(max(0, deadline - time.monotonic()))
+        return False
+
+    def write_chunk(self, payload):
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+
+class MockWikimediaHandler(BaseHTTPRequestHandler):
+    """
+    Answers list=search, prop=imageinfo and generator=search queries after
+    server.latency seconds, and serves a PNG for every image URL it hands out.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith("/images/"):
+            # Pad the pixel to realistic sizes: multi-megabyte originals, thumbnails that grow with width
+            thumb = re.search(r"/(\d+)px-[^/]+$", parsed.path)
+            size = int(thumb.group(1)) ** 2 // 8 if thumb else self.server.original_bytes
+            body = PIXEL_PNG + b"\0" * max(0, size - len(PIXEL_PNG))
+            with self.server.lock:
+                self.server.image_bytes += len(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        if params.get("list") == "search":
+            titles = self.titles_for(params.get("srsearch", ""), int(params.get("srlimit", 10)))
+            payload = {"query": {"search": [{"ns": 6, "title": title} for title in titles]}}
+        elif params.get("generator") == "search":
+            titles = self.titles_for(params.get("gsrsearch", ""), int(params.get("gsrlimit", 10)))
+            payload = {"query": {"pages": {str(-i - 1): self.page_for(title, params, index=i)
+                                           for i, title in enumerate(titles)}}}
+        elif "titles" in params:
+            titles = params["titles"].split("|")
+            payload = {"query": {"pages": {str(-i - 1): self.page_for(title, params)
+                                           for i, title in enumerate(titles)}}}
+        else:
+            payload = {"error": {"code": "badrequest"}}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def titles_for(self, query, limit):
+        slug = re.sub(r"\W+", "_", query.strip()).strip("_") or "image"
+        return [f"File:{slug}_{i}.jpg" for i in range(min(limit, self.server.results_per_query))]
+
+    def page_for(self, title, params, index=0):
+        name = title.split(":", 1)[-1]
+        host = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+        info = {"url": f"{host}/images/{name}", "mime": "image/jpeg", "width": 4000, "height": 3000}
+        width = params.get("iiurlwidth")
+        if width:
+            info["thumburl"] = f"{host}/images/thumb/{name}/{width}px-{name}"
+            info["thumbwidth"] = int(width)
+        return {"title": title, "index": index + 1, "imageinfo": [info]}
+
+
+def start_server(handler, **attributes):
+    """Start a threaded HTTP server on a free local port and return it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_mock_ollama(tokens_per_second=200.0, response_text=None, models=("qwen2.5",)):
+    return start_server(MockOllamaHandler, tokens_per_second=tokens_per_second, cancelled=0,
+                        response_text=response_text or build_canned_page(), models=list(models))
+
+
+def start_mock_wikimedia(latency=0.15, results_per_query=20, original_bytes=4 * 1024 * 1024):
+    return start_server(MockWikimediaHandler, latency=latency, results_per_query=results_per_query,
+                        original_bytes=original_bytes, image_bytes=0)
+
+
+def server_url(server):
+    return f"http://{server.server_address[0]}:{server.server_address[1]}"
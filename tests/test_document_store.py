@@ -0,0 +1,57 @@
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import DOCUMENT_URL_PREFIX, DocumentStore
+
+
+def doc_id(url):
+    return url[len(DOCUMENT_URL_PREFIX):]
+
+
+def test_put_returns_a_new_url_per_document():
+    store = DocumentStore()
+    first, second = store.put("<p>one</p>"), store.put("<p>two</p>")
+    assert first.startswith(DOCUMENT_URL_PREFIX) and first != second
+    assert store.get(doc_id(first)) == b"<p>one</p>"
+    assert store.get("missing") is None
+
+
+def test_put_with_an_earlier_url_replaces_it():
+    store = DocumentStore()
+    url = store.put("<p>first draft</p>")
+    assert store.put("<p>é</p>", url) == url
+    assert store.get(doc_id(url)) == "<p>é</p>".encode("utf-8")
+    assert store.size == len("<p>é</p>".encode("utf-8"))
+    # Other URLs are not documents of the store
+    assert store.put("<p>x</p>", "https://example.com/").startswith(DOCUMENT_URL_PREFIX)
+
+
+def test_remove():
+    store = DocumentStore()
+    url = store.put("<p>one</p>")
+    store.remove(url)
+    store.remove(url)
+    store.remove("https://example.com/")
+    assert store.get(doc_id(url)) is None
+    assert store.size == 0
+
+
+def test_evicts_least_recently_used_past_max_bytes():
+    store = DocumentStore(max_bytes=10)
+    first, second = store.put("aaaa"), store.put("bbbb")
+    store.get(doc_id(first))
+    third = store.put("cccc")
+    assert store.get(doc_id(second)) is None
+    assert store.get(doc_id(first)) == b"aaaa" and store.get(doc_id(third)) == b"cccc"
+    assert store.size == 8
+
+
+def test_newest_document_is_kept_however_large():
+    store = DocumentStore(max_bytes=10)
+    small = store.put("aaaa")
+    large = store.put("x" * 50)
+    assert store.get(doc_id(small)) is None
+    assert store.get(doc_id(large)) == b"x" * 50
+    assert store.size == 50
@@ -0,0 +1,67 @@
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import StreamingHtmlExtractor, extract_html
+
+PAGE = "<html><head><title>T</title></head><body><p>Hi</p></body></html>"
+
+
+def stream(content, size):
+    """Feeds content in chunks of size characters, checking each delta; returns the result."""
+    extractor = StreamingHtmlExtractor()
+    html = ""
+    for start in range(0, len(content), size):
+        delta = extractor.feed(content[start:start + size])
+        # A delta extends the page, or replaces it when a fence turns out to hold the real one
+        assert extractor.html in (html + delta, delta)
+        assert extractor.length == len(extractor.html)
+        html = extractor.html
+    return extractor.result()
+
+
+RESPONSES = [
+    # (response, expected page)
+    (PAGE, PAGE),
+    ("  \n" + PAGE + "\nHope this helps!", PAGE),
+    ("Sure! Here it is:\n```html\n" + PAGE + "\n```\nEnjoy.", PAGE),
+    ("Sure! Here it is:\n<!DOCTYPE html>" + PAGE + " trailing", "<!DOCTYPE html>" + PAGE),
+    ("Here's the <html> page you asked for:\n```html\n" + PAGE + "\n```", PAGE),
+    ("<think>The user wants a page about cats.</think>\n```html\n" + PAGE + "\n```", PAGE),
+    ("<THINK>plan: use <html> and </html></THINK>\n" + PAGE, PAGE),
+    ("<think>\nmaybe ```html\n</think>Okay.\n```html\n" + PAGE + "\n```", PAGE),
+    ("```HTML\n" + PAGE, PAGE),
+]
+
+
+@pytest.mark.parametrize("response, expected", RESPONSES)
+def test_extract_html(response, expected):
+    assert extract_html(response) == expected
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 8])
+@pytest.mark.parametrize("response, expected", RESPONSES)
+def test_chunk_boundaries_inside_markers(response, expected, size):
+    # Small chunks split every marker (```html, <html, </html>, <think>, </think>) somewhere
+    assert stream(response, size) == expected
+
+
+def test_no_html_returns_whole_response():
+    assert extract_html("I can't build that page.") == "I can't build that page."
+
+
+def test_unterminated_think_is_not_html():
+    assert extract_html("<think>still thinking") == "<think>still thinking"
+
+
+def test_fence_switch_replaces_partial_document():
+    extractor = StreamingHtmlExtractor()
+    assert extractor.feed("Here's the ") == ""
+    assert extractor.feed("<html> page you asked for:\n``") == "<html> page you asked for:\n"
+    # The fence arrives split across chunks
+    assert extractor.feed("`html\n<html><body>") == "<html><body>"
+    assert extractor.html == "<html><body>"
+    extractor.feed("</body></html>\n```")
+    assert extractor.done
+    assert extractor.result() == "<html><body></body></html>"
@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import GenerationJob, GenerationRegistry, GenerationScheduler
+
+KEY = GenerationRegistry.make_key("Cats", "fingerprint", "qwen2.5")
+
+
+def test_key_hashes_the_design():
+    topic, design_hash, model = KEY
+    assert (topic, model) == ("Cats", "qwen2.5")
+    assert design_hash != "fingerprint"
+    assert GenerationRegistry.make_key("Cats", "other", "qwen2.5") != KEY
+
+
+def test_identical_requests_share_one_generation():
+    registry = GenerationRegistry()
+    first, second = object(), object()
+    future, is_new = registry.attach(KEY, first)
+    assert is_new
+    assert registry.attach(KEY, second) == (future, False)
+    assert registry.attach(KEY, first) == (future, False)
+    assert registry.tabs_for(KEY) == [first, second]
+    assert registry.coalesced_count == 2
+
+
+def test_force_new_replaces_the_running_generation():
+    registry = GenerationRegistry()
+    old, _ = registry.attach(KEY, object())
+    future, is_new = registry.attach(KEY, object(), force_new=True)
+    assert is_new and future is not old
+    # The old generation finishing leaves the new one in place
+    registry.finish(KEY, old, "<p>old</p>")
+    assert old.result() == "<p>old</p>"
+    assert registry.attach(KEY, None) == (future, False)
+
+
+def test_finish_resolves_and_releases_the_key():
+    registry = GenerationRegistry()
+    future, _ = registry.attach(KEY, object())
+    registry.finish(KEY, future, "<p>page</p>")
+    assert future.result() == "<p>page</p>"
+    assert registry.tabs_for(KEY) == []
+    assert registry.attach(KEY, object())[1]
+
+
+def test_detaching_the_last_tab_cancels_the_generation():
+    registry = GenerationRegistry()
+    first, second = object(), object()
+    future, _ = registry.attach(KEY, first)
+    registry.attach(KEY, second)
+    job = GenerationJob(None, GenerationScheduler.FOREGROUND)
+    registry.set_job(KEY, future, job)
+    registry.detach(first)
+    assert not future.cancelled() and not job.cancelled
+    registry.detach(second)
+    assert future.cancelled() and job.cancelled
+    # A result arriving afterwards is dropped
+    registry.finish(KEY, future, "<p>late</p>")
+
+
+def test_job_scheduled_after_cancel_is_cancelled():
+    registry = GenerationRegistry()
+    tab = object()
+    future, _ = registry.attach(KEY, tab)
+    registry.detach(tab)
+    job = GenerationJob(None, GenerationScheduler.FOREGROUND)
+    registry.set_job(KEY, future, job)
+    assert job.cancelled
+
+
+def test_cancel_runs_the_close_callback_once():
+    job = GenerationJob(None, GenerationScheduler.FOREGROUND)
+    closed = []
+    job.set_close_callback(lambda: closed.append("first"))
+    job.set_close_callback(lambda: closed.append("second"))
+    job.cancel()
+    job.cancel()
+    assert closed == ["second"]
+    # Registered after the cancel, it runs straight away
+    job.set_close_callback(lambda: closed.append("late"))
+    assert closed == ["second", "late"]
+
+
+def test_cleared_close_callback_is_not_run():
+    job = GenerationJob(None, GenerationScheduler.FOREGROUND)
+    closed = []
+    job.set_close_callback(lambda: closed.append(True))
+    job.set_close_callback(None)
+    job.cancel()
+    assert closed == []
+
+
+def run_blocked(scheduler, submit):
+    """Holds the only worker busy while submit(scheduler, record) queues jobs; returns the order they ran in."""
+    order = []
+    release, done = threading.Event(), threading.Event()
+    scheduler.submit(lambda job: release.wait(5), GenerationScheduler.FOREGROUND)
+
+    def record(name):
+        return lambda job: order.append(name)
+
+    submit(scheduler, record)
+    scheduler.submit(lambda job: done.set(), GenerationScheduler.IDLE + 1)
+    release.set()
+    assert done.wait(5)
+    return order
+
+
+def test_scheduler_runs_lowest_priority_value_first_in_submission_order():
+    def submit(scheduler, record):
+        scheduler.submit(record("idle"), GenerationScheduler.IDLE)
+        scheduler.submit(record("background 1"), GenerationScheduler.BACKGROUND)
+        scheduler.submit(record("foreground"), GenerationScheduler.FOREGROUND)
+        scheduler.submit(record("background 2"), GenerationScheduler.BACKGROUND)
+
+    order = run_blocked(GenerationScheduler(max_workers=1), submit)
+    assert order == ["foreground", "background 1", "background 2", "idle"]
+
+
+def test_scheduler_skips_cancelled_jobs_and_honours_new_priorities():
+    def submit(scheduler, record):
+        scheduler.submit(record("cancelled"), GenerationScheduler.FOREGROUND).cancel()
+        scheduler.submit(record("background"), GenerationScheduler.BACKGROUND)
+        promoted = scheduler.submit(record("promoted"), GenerationScheduler.IDLE)
+        scheduler.set_priority(promoted, GenerationScheduler.FOREGROUND)
+
+    order = run_blocked(GenerationScheduler(max_workers=1), submit)
+    # The promoted job runs once, from its new place in the queue
+    assert order == ["promoted", "background"]
+
+
+def test_set_priority_leaves_running_jobs_alone():
+    scheduler = GenerationScheduler(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+    job = scheduler.submit(lambda job: (started.set(), release.wait(5)), GenerationScheduler.BACKGROUND)
+    assert started.wait(5)
+    scheduler.set_priority(job, GenerationScheduler.IDLE)
+    assert job.priority == GenerationScheduler.BACKGROUND
+    release.set()
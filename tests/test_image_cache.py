@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import ImageCache
+
+URLS = ["https://upload.wikimedia.org/a.jpg", "https://upload.wikimedia.org/b.jpg"]
+
+
+def make_cache(tmp_path, **options):
+    return ImageCache(path=str(tmp_path / "images.sqlite3"), **options)
+
+
+def age(cache, query, seconds, column="created"):
+    """Moves an entry's created (or accessed) time seconds into the past."""
+    cache.connection.execute(f"UPDATE image_thumbnails SET {column} = {column} - ? WHERE query = ?",
+                             (seconds, ImageCache.normalize(query)))
+
+
+def accessed(cache, query):
+    return cache.connection.execute("SELECT accessed FROM image_thumbnails WHERE query = ?",
+                                    (ImageCache.normalize(query),)).fetchone()[0]
+
+
+def test_normalize():
+    assert ImageCache.normalize("  Red   Panda, eating!") == "red panda eating"
+
+
+def test_put_then_get_matches_normalized_query(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("red panda") is None
+    cache.put("Red panda!", URLS)
+    assert cache.get("red   PANDA") == URLS
+
+
+@pytest.mark.parametrize("urls, ttl_name", [(URLS, "ttl"), ([], "negative_ttl")])
+def test_entries_expire(tmp_path, urls, ttl_name):
+    cache = make_cache(tmp_path, ttl=100, negative_ttl=10)
+    cache.put("query", urls)
+    ttl = getattr(cache, ttl_name)
+    age(cache, "query", ttl - 1)
+    assert cache.get("query") == urls
+    age(cache, "query", 2)
+    assert cache.get("query") is None
+    assert cache.connection.execute("SELECT COUNT(*) FROM image_thumbnails").fetchone()[0] == 0
+
+
+def test_hits_only_write_access_times_past_the_resolution(tmp_path):
+    cache = make_cache(tmp_path, access_resolution=60)
+    cache.put("query", URLS)
+    age(cache, "query", 30, "accessed")
+    before = accessed(cache, "query")
+    cache.get("query")
+    assert accessed(cache, "query") == before
+    age(cache, "query", 31, "accessed")
+    cache.get("query")
+    assert accessed(cache, "query") > before
+
+
+def test_drops_least_recently_used_past_max_entries(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("one", URLS)
+    cache.put("two", URLS)
+    age(cache, "two", 10, "accessed")
+    cache.put("three", URLS)
+    assert cache.get("two") is None
+    assert cache.get("one") == URLS and cache.get("three") == URLS
+
+
+def test_old_images_table_is_dropped(tmp_path):
+    path = tmp_path / "images.sqlite3"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE images (query TEXT PRIMARY KEY, urls TEXT)")
+    connection.commit()
+    connection.close()
+    make_cache(tmp_path).put("query", URLS)
+    tables = {row[0] for row in sqlite3.connect(path).execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"image_thumbnails"}
@@ -0,0 +1,47 @@
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import local_library_for
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css", "bootstrap.min.css"),
+    ("https://cdn.jsdelivr.net/npm/bootstrap@4.6.0/dist/css/bootstrap.css", "bootstrap.min.css"),
+    ("https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0/js/bootstrap.min.js", "bootstrap.bundle.min.js"),
+    ("https://cdn.jsdelivr.net/npm/bootstrap@4.6.2/dist/js/bootstrap.bundle.min.js", "bootstrap.bundle.min.js"),
+    ("https://code.jquery.com/jquery-3.5.1.min.js", "jquery.min.js"),
+    ("https://code.jquery.com/jquery-3.5.1.slim.min.js", "jquery.slim.min.js"),
+    ("https://ajax.googleapis.com/ajax/libs/jquery/3.6.0/jquery.min.js", "jquery.min.js"),
+    ("//cdnjs.cloudflare.com/ajax/libs/jquery/3.3.1/jquery.slim.js", "jquery.slim.min.js"),
+    ("https://CDN.jsdelivr.net/npm/Bootstrap@4.5.0/dist/css/Bootstrap.min.css", "bootstrap.min.css"),
+])
+def test_bundled_major_versions_are_rewritten(url, expected):
+    assert local_library_for(url) == expected
+
+
+@pytest.mark.parametrize("url", [
+    "https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js",
+    "https://cdnjs.cloudflare.com/ajax/libs/popper.js/1.14.7/umd/popper.js",
+])
+def test_popper_1_is_covered_by_the_bundle(url):
+    assert local_library_for(url) == ""
+
+
+@pytest.mark.parametrize("url", [
+    # Other major versions keep their CDN
+    "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css",
+    "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js",
+    "https://cdn.jsdelivr.net/npm/@popperjs/core@2.11.8/dist/umd/popper.min.js",
+    "https://code.jquery.com/jquery-1.12.4.min.js",
+    # No version to go by
+    "https://code.jquery.com/jquery.min.js",
+    # Not a library we bundle, or not a CDN URL at all
+    "https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js",
+    "https://example.com/js/main.js",
+    "css/bootstrap.min.css",
+    "file:///bootstrap/4.5.2/css/bootstrap.min.css",
+])
+def test_everything_else_is_left_alone(url):
+    assert local_library_for(url) is None
@@ -0,0 +1,111 @@
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import minify_css, minify_html, minify_js
+
+
+def test_collapses_whitespace_between_tags():
+    html = "<html>\n  <body>\n    <p>Hello    \n\n   world</p>\n  </body>\n</html>\n"
+    assert minify_html(html) == "<html>\n<body>\n<p>Hello\nworld</p>\n</body>\n</html>"
+
+
+def test_keeps_non_breaking_spaces():
+    assert minify_html("<p>a  b</p>") == "<p>a  b</p>"
+
+
+@pytest.mark.parametrize("tag", [
+    '<div title="two  spaces\n  and a line">',
+    "<input value='  padded  '>",
+    '<a   href="/x"\n   class="nav   link">',
+    '<button onclick="if (a)\n  b();">',
+    '<a href="x>y"  title="  gt  inside  ">',
+])
+def test_copies_tags_and_attribute_values(tag):
+    assert minify_html(f"<p>  {tag}  text  </p>") == f"<p> {tag} text </p>"
+
+
+@pytest.mark.parametrize("html", [
+    '<p>a  <img alt="unterminated   quote',
+    "<p>a  <div class='open   ended",
+    "<p>a  <span   title=x",
+])
+def test_broken_tag_runs_to_the_end(html):
+    # Like the browser, everything after an unterminated tag or quote belongs to it
+    head, tag = html.split("  ", 1)
+    assert minify_html(html) == f"{head} {tag}"
+
+
+def test_broken_markup_is_kept():
+    html = "<div><p>one   <b>two</div>   <p>three</i>  <pre>  unterminated\n   pre"
+    assert minify_html(html) == "<div><p>one <b>two</div> <p>three</i> <pre>  unterminated\n   pre"
+
+
+def test_text_that_is_not_a_tag_is_collapsed():
+    assert minify_html("<p>1  <  2   and  3 >  2</p>") == "<p>1 < 2 and 3 > 2</p>"
+
+
+@pytest.mark.parametrize("element", ["pre", "textarea"])
+def test_preformatted_elements_are_kept(element):
+    html = f'<{element} class="a  b">  line one\n\n    line two  </{element}>'
+    assert minify_html(f"<div>  {html}  </div>") == f"<div> {html} </div>"
+
+
+def test_comments_are_dropped_but_conditional_comments_kept():
+    html = "<p>a<!-- note --></p><!--[if IE]><p>old</p><![endif]-->"
+    assert minify_html(html) == "<p>a</p><!--[if IE]><p>old</p><![endif]-->"
+
+
+def test_repeated_stylesheet_keeps_last_occurrence():
+    first = '<link rel="stylesheet" href="a.css">'
+    second = '<link rel="stylesheet" href="b.css">'
+    html = f"{first}{second}{first}<style>p{{color:red}}</style><style>p{{color:red}}</style>"
+    assert minify_html(html) == f"{second}{first}<style>p{{color:red}}</style>"
+
+
+def test_repeated_script_keeps_first_occurrence():
+    jquery = '<script src="jquery.min.js"></script>'
+    bootstrap = '<script src="bootstrap.min.js"></script>'
+    html = f"{jquery}{bootstrap}{jquery}"
+    assert minify_html(html) == f"{jquery}{bootstrap}"
+
+
+def test_script_open_tag_with_quoted_gt():
+    html = '<script data-x="a > b">\n    run();\n</script>'
+    assert minify_html(html) == '<script data-x="a > b">run();</script>'
+
+
+def test_non_javascript_scripts_are_kept():
+    html = '<script type="application/ld+json">\n  {"a":   1}\n</script>'
+    assert minify_html(html) == html
+
+
+def test_minify_css():
+    css = "/* c */\np {\n  color: red ;\n  width: calc(100% - 2px);\n}\na::after { content: \"  x ; y  \" }"
+    assert minify_css(css) == 'p{color:red;width:calc(100% - 2px)}a::after{content:"  x ; y  "}'
+
+
+def test_minify_js_strips_indentation_and_line_comments():
+    js = "\n  // setup\n  var a = 1;\n\n  function f() {\n    return a;  // inline stays\n  }\n"
+    assert minify_js(js) == "var a = 1;\nfunction f() {\nreturn a;  // inline stays\n}"
+
+
+def test_minify_js_keeps_continued_strings():
+    js = 'var s = "one \\\n    // two \\\n  three";\nf(s);'
+    assert minify_js(js) == js
+
+
+def test_minify_js_keeps_line_comments_inside_block_comments():
+    js = "/* header\n// closes here */\nrun();"
+    assert minify_js(js) == js
+
+
+def test_minify_js_after_block_comment():
+    js = "/* a */ x();\n// dropped\ny();"
+    assert minify_js(js) == "/* a */ x();\ny();"
+
+
+def test_minify_js_keeps_template_literals():
+    js = "const t = `\n  line\n  // not a comment\n`;"
+    assert minify_js(js) == js
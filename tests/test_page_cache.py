@@ -0,0 +1,87 @@
+import json
+import time
+
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import PageCache
+
+
+def make_cache(tmp_path, **options):
+    return PageCache(cache_dir=str(tmp_path), **options)
+
+
+def saved_index(tmp_path):
+    with open(tmp_path / "index.json") as file:
+        return json.load(file)
+
+
+def test_key_covers_topic_model_and_design():
+    key = PageCache.make_key("Cats", "qwen2.5", "fingerprint")
+    assert key == PageCache.make_key("Cats", "qwen2.5", "fingerprint")
+    assert len({key,
+                PageCache.make_key("Dogs", "qwen2.5", "fingerprint"),
+                PageCache.make_key("Cats", "llama3", "fingerprint"),
+                PageCache.make_key("Cats", "qwen2.5", "other"),
+                PageCache.make_key("Cats", "qwen2.5")}) == 5
+
+
+def test_put_then_get(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("a", "<p>é</p>")
+    assert cache.get("a") == "<p>é</p>"
+    assert cache.get("missing") is None
+    # A fresh instance reads the index written by put
+    assert make_cache(tmp_path).get("a") == "<p>é</p>"
+
+
+def test_expired_entry_is_dropped(tmp_path):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.put("a", "<p>old</p>")
+    cache.index["a"]["created"] -= 61
+    assert cache.get("a") is None
+    assert "a" not in cache.index
+    assert not (tmp_path / "a.html").exists()
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    cache.index["a"]["accessed"] = cache.index["b"]["accessed"] + 1
+    cache.put("c", "cccc")
+    assert set(cache.index) == {"a", "c"}
+    assert not (tmp_path / "b.html").exists()
+    assert set(saved_index(tmp_path)) == {"a", "c"}
+
+
+def test_missing_page_file_is_a_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("a", "<p>a</p>")
+    (tmp_path / "a.html").unlink()
+    assert cache.get("a") is None
+    assert "a" not in cache.index
+
+
+def test_hits_update_the_index_in_memory_until_flushed(tmp_path):
+    cache = make_cache(tmp_path, index_flush_interval=3600)
+    cache.put("a", "<p>a</p>")
+    accessed = saved_index(tmp_path)["a"]["accessed"]
+    time.sleep(0.01)
+    assert cache.get("a") == "<p>a</p>"
+    assert saved_index(tmp_path)["a"]["accessed"] == accessed
+    assert cache.dirty
+    cache.flush()
+    assert saved_index(tmp_path)["a"]["accessed"] > accessed
+    assert not cache.dirty
+
+
+def test_hits_flush_once_the_interval_has_passed(tmp_path):
+    cache = make_cache(tmp_path, index_flush_interval=0)
+    cache.put("a", "<p>a</p>")
+    accessed = saved_index(tmp_path)["a"]["accessed"]
+    time.sleep(0.01)
+    cache.get("a")
+    assert saved_index(tmp_path)["a"]["accessed"] > accessed
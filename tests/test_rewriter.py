@@ -0,0 +1,67 @@
+from urllib.parse import unquote
+
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+import GenBrowser
+from GenBrowser import apply_image_urls, collect_image_slots, parse_page, post_process_html
+
+pytestmark = pytest.mark.skipif(GenBrowser.lxml is None, reason="lxml is not installed")
+
+THUMB = "https://upload.wikimedia.org/wikipedia/commons/thumb/a/ab/Red_panda.jpg/1024px-Red_panda.jpg"
+
+PAGES = [
+    """<!DOCTYPE html><html><head><title>Cats</title>
+<link rel="stylesheet" href="https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css" integrity="x" crossorigin="anonymous">
+<script src="https://code.jquery.com/jquery-3.5.1.slim.min.js"></script>
+<script src="https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js"></script></head>
+<body><div class="container" style="background-image: url('placeholder.jpg')"><h1>Cats &amp; kittens</h1>
+<div class="card"><img src="placeholder.jpg" alt="A sleeping cat"></div>
+<img src="cat.jpg" alt="Kitten playing" width="300"></div>
+<script>if (a < b && c > d) { document.write("</p>"); }</script></body></html>""",
+    # A fragment without <html>, <head> or <body>
+    """<h1>Red pandas</h1><p>They live in <b>forests</b>.<img src="panda.jpg" alt="Red panda in a tree">""",
+    # Bootstrap 5 keeps its CDN links, and the bundled copies are added as well
+    """<html><head><link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css">
+</head><body><section style="background-image:url(your_image_here)"><p>Text</p></section></body></html>""",
+]
+
+
+def outline(html):
+    """
+    The elements, attributes and text of a page as a browser would build it: missing
+    <html>/<body> wrappers added, attribute order and URL escaping evened out.
+    """
+    root = GenBrowser.lxml.html.document_fromstring(html)
+    return [(element.tag, {name: unquote(value) if name in ("src", "href") else value
+                           for name, value in element.attrib.items()},
+             element.text, element.tail)
+            for element in root.iter() if isinstance(element.tag, str)]
+
+
+@pytest.mark.parametrize("html", PAGES)
+def test_post_processing_matches(html):
+    results = {}
+    for rewriter in ("soup", "lxml"):
+        final_html, _, slots = post_process_html(html, "cats", defer_images=True, observe_images=True,
+                                                 local_libraries=True, rewriter=rewriter)
+        results[rewriter] = outline(final_html), [(slot.id, slot.query, slot.bg_url) for slot in slots]
+    assert results["lxml"] == results["soup"]
+
+
+@pytest.mark.parametrize("html", PAGES)
+def test_resolved_images_match(html):
+    results = {}
+    for rewriter in ("soup", "lxml"):
+        document = parse_page(html, rewriter)
+        slots = collect_image_slots(document, "cats")
+        apply_image_urls(slots, {slot.id: THUMB for slot in slots})
+        results[rewriter] = outline(document.serialize())
+    assert results["lxml"] == results["soup"]
+
+
+def test_backends():
+    assert type(parse_page(PAGES[0], "lxml")).__name__ == "LxmlDocument"
+    assert type(parse_page(PAGES[0], "soup")).__name__ == "SoupDocument"
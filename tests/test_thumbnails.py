@@ -0,0 +1,68 @@
+import pytest
+
+# GenBrowser imports Qt WebEngine, which raises ImportError (not just ModuleNotFoundError) without its system libraries
+pytest.importorskip("PyQt5.QtWebEngineWidgets", exc_type=ImportError)
+
+from GenBrowser import (IMAGE_RENDER_WIDTH, ImageSlot, image_sources, local_image_url, thumbnail_for_width,
+                        thumbnail_variants)
+
+BASE = "https://upload.wikimedia.org/wikipedia/commons/thumb/a/ab/Red_panda.jpg"
+THUMB = f"{BASE}/1024px-Red_panda.jpg"
+ORIGINAL = "https://upload.wikimedia.org/wikipedia/commons/a/ab/Red_panda.jpg"
+
+
+def img_slot(width=None):
+    return ImageSlot(0, {"width": width} if width else {}, "red panda", None)
+
+
+def test_variants_stop_at_the_thumbnail_width():
+    assert thumbnail_variants(THUMB) == [
+        (330, f"{BASE}/330px-Red_panda.jpg"),
+        (500, f"{BASE}/500px-Red_panda.jpg"),
+        (960, f"{BASE}/960px-Red_panda.jpg"),
+        (1024, THUMB),
+    ]
+
+
+def test_small_thumbnail_has_only_itself():
+    assert thumbnail_variants(f"{BASE}/250px-Red_panda.jpg") == [(250, f"{BASE}/250px-Red_panda.jpg")]
+
+
+@pytest.mark.parametrize("url", [ORIGINAL, "https://example.com/images/640px-cat.jpg", ""])
+def test_non_thumbnails_have_no_variants(url):
+    assert thumbnail_variants(url) == []
+    assert thumbnail_for_width(url, 500) == url
+
+
+@pytest.mark.parametrize("width, expected", [(100, 330), (330, 330), (331, 500), (960, 960), (2000, 1024)])
+def test_thumbnail_for_width_picks_the_narrowest_wide_enough(width, expected):
+    wanted = THUMB if expected == 1024 else f"{BASE}/{expected}px-Red_panda.jpg"
+    assert thumbnail_for_width(THUMB, width) == wanted
+
+
+def test_img_gets_srcset_of_every_variant():
+    src, srcset = image_sources(img_slot("400"), THUMB)
+    assert src == f"{BASE}/500px-Red_panda.jpg"
+    assert srcset == ", ".join(f"{url} {width}w" for width, url in thumbnail_variants(THUMB))
+
+
+def test_img_without_width_uses_the_render_width():
+    src, _ = image_sources(img_slot(), THUMB)
+    assert src == thumbnail_for_width(THUMB, IMAGE_RENDER_WIDTH)
+
+
+def test_background_gets_no_srcset():
+    slot = ImageSlot(0, {}, "red panda", "placeholder.jpg")
+    assert image_sources(slot, THUMB) == (THUMB, "")
+
+
+def test_local_sources_are_genimg_urls():
+    src, srcset = image_sources(img_slot("400"), THUMB, local=True)
+    assert src == local_image_url(f"{BASE}/500px-Red_panda.jpg", 400)
+    assert src.startswith("genimg:image?w=400&src=https%3A%2F%2Fupload.wikimedia.org%2F")
+    assert srcset.split(", ")[0] == f"{local_image_url(f'{BASE}/330px-Red_panda.jpg', 330)} 330w"
+
+
+def test_local_sources_leave_other_hosts_alone():
+    url = "https://example.com/images/cat.jpg"
+    assert image_sources(img_slot(), url, local=True) == (url, "")